@@ -0,0 +1,156 @@
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connection
+from django.urls import Resolver404, resolve
+from rest_framework.exceptions import ValidationError
+
+from api.cache import RequestCache, request_context
+
+BATCH_VIEW_NAME = 'api:batch'
+BATCH_NAMESPACE = 'api'
+SAFE_METHODS = ('GET', 'HEAD')
+BATCH_METHODS = SAFE_METHODS + ('POST', 'PUT', 'PATCH', 'DELETE')
+SKIPPED_META = ('CONTENT_TYPE', 'CONTENT_LENGTH', 'QUERY_STRING', 'wsgi.input')
+BATCH_INVALID = 'Ожидается список подзапросов'
+BATCH_TOO_LARGE = 'В пакете не больше {limit} подзапросов'
+BATCH_ITEM_INVALID = (
+    'Подзапрос {number}: нужны method из {methods} и path'
+)
+BATCH_NESTED = 'Подзапрос {number}: вложенные пакеты не поддерживаются'
+NOT_FOUND = {'detail': 'Страница не найдена.'}
+SERVER_ERROR = {'detail': 'Ошибка сервера при выполнении подзапроса.'}
+STREAMING_UNSUPPORTED = {
+    'detail': 'Потоковые ответы в пакете не поддерживаются.'
+}
+
+logger = logging.getLogger(__name__)
+
+
+def parse_item(number, item):
+    if (not isinstance(item, dict) or not isinstance(item.get('path'), str)
+            or str(item.get('method', 'GET')).upper() not in BATCH_METHODS):
+        raise ValidationError(BATCH_ITEM_INVALID.format(
+            number=number, methods=', '.join(BATCH_METHODS)
+        ))
+    url = urlsplit(item['path'])
+    try:
+        match = resolve(url.path)
+    except Resolver404:
+        match = None
+    if match is not None and match.namespace != BATCH_NAMESPACE:
+        match = None
+    if match is not None and match.view_name == BATCH_VIEW_NAME:
+        raise ValidationError(BATCH_NESTED.format(number=number))
+    return {
+        'method': str(item.get('method', 'GET')).upper(),
+        'url': url,
+        'match': match,
+        'body': item.get('body')
+    }
+
+
+def parse_batch(data):
+    if not isinstance(data, list):
+        raise ValidationError(BATCH_INVALID)
+    if len(data) > settings.BATCH_MAX_REQUESTS:
+        raise ValidationError(
+            BATCH_TOO_LARGE.format(limit=settings.BATCH_MAX_REQUESTS)
+        )
+    return [parse_item(number, item) for number, item in enumerate(data)]
+
+
+def build_request(parent, item):
+    content = b'' if item['body'] is None else json.dumps(
+        item['body']
+    ).encode()
+    environ = {
+        name: value for name, value in parent.META.items()
+        if name not in SKIPPED_META
+    }
+    environ.update({
+        'REQUEST_METHOD': item['method'],
+        'SCRIPT_NAME': '',
+        'PATH_INFO': item['url'].path,
+        'QUERY_STRING': item['url'].query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'wsgi.input': io.BytesIO(content)
+    })
+    request = WSGIRequest(environ)
+    request.resolver_match = item['match']
+    if parent.user.is_authenticated:
+        request._force_auth_user = parent.user
+        request._force_auth_token = parent.auth
+    return request
+
+
+def response_body(response):
+    if hasattr(response, 'render'):
+        response.render()
+    content = response.content
+    if not content:
+        return None
+    if 'json' in response.get('Content-Type', ''):
+        return json.loads(content.decode())
+    return content.decode()
+
+
+def run_item(parent, item, cache):
+    match = item['match']
+    if match is None:
+        return {'status': 404, 'body': NOT_FOUND}
+    try:
+        with request_context(cache):
+            response = match.func(
+                build_request(parent, item), *match.args, **match.kwargs
+            )
+            if response.streaming:
+                response.close()
+                return {'status': 400, 'body': STREAMING_UNSUPPORTED}
+            body = response_body(response)
+    except Exception:
+        logger.exception('Batch sub-request %s failed', item['url'].path)
+        return {'status': 500, 'body': SERVER_ERROR}
+    return {'status': response.status_code, 'body': body}
+
+
+def run_concurrent(parent, items, cache):
+    def run(item):
+        try:
+            return run_item(parent, item, cache)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(
+            max_workers=min(settings.BATCH_WORKERS, len(items))) as executor:
+        return list(executor.map(run, items))
+
+
+def group_items(items):
+    groups = []
+    for item in items:
+        safe = item['method'] in SAFE_METHODS
+        if safe and groups and groups[-1][0]:
+            groups[-1][1].append(item)
+        else:
+            groups.append((safe, [item]))
+    return groups
+
+
+def run_batch(parent, items):
+    cache = RequestCache()
+    results = []
+    for safe, group in group_items(items):
+        if safe and len(group) > 1 and not connection.in_atomic_block:
+            results.extend(run_concurrent(parent, group, cache))
+            continue
+        results.extend(run_item(parent, item, cache) for item in group)
+        if not safe:
+            cache.clear()
+    return results
@@ -0,0 +1,368 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+
+RECIPE_VERSION = 'recipe:{id}:version'
+AUTHOR_VERSION = 'author:{id}:version'
+AUTHOR_RECIPES_VERSION = 'author:{id}:recipes:version'
+TAG_VERSION = 'tag:{id}:version'
+TABLE_VERSION = 'table:{name}:version'
+MODIFIED = '{key}:modified'
+DOCUMENT = 'recipe:{id}:document:{versions}{variant}'
+DOCUMENT_HITS = 'recipe:document:hits'
+DOCUMENT_MISSES = 'recipe:document:misses'
+DOCUMENT_TABLES = ('tags', 'ingredients')
+RESPONSE = 'response:{key}'
+RESPONSE_HITS = 'response:hits'
+RESPONSE_MISSES = 'response:misses'
+RESPONSE_BYTES = 'response:bytes'
+TABLE_CACHE = 'table:{names}:{key}:{versions}'
+CHANGE_LOG_VERSION = 'log:{name}:version'
+CHANGE_LOG_ENTRY = 'log:{name}:{number}'
+CHANGE_LOG_LIMIT = 1000
+CHANGE_LOG_TIMEOUT = 24 * 60 * 60
+INDEX_REBUILD_INTERVAL = 10 * 60
+RECIPE_LOG = 'recipes'
+FAVORITES_LOG = 'favorites'
+
+
+def new_version():
+    return int(time.time() * 1000000)
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = new_version()
+            cache.add(key, version, None)
+            versions[key] = cache.get(key, version)
+    return versions
+
+
+def get_modified(keys):
+    modified = cache.get_many([MODIFIED.format(key=key) for key in keys])
+    for key in keys:
+        modified_key = MODIFIED.format(key=key)
+        if modified_key not in modified:
+            now = int(time.time())
+            cache.add(modified_key, now, None)
+            modified[modified_key] = cache.get(modified_key, now)
+    return max(modified.values(), default=None)
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), None)
+    cache.set(MODIFIED.format(key=key), int(time.time()), None)
+
+
+def invalidate(*keys):
+    def bump():
+        for key in keys:
+            bump_version(key)
+    transaction.on_commit(bump)
+
+
+def invalidate_recipe(recipe_id):
+    invalidate(RECIPE_VERSION.format(id=recipe_id))
+
+
+def invalidate_author(author_id):
+    invalidate(AUTHOR_VERSION.format(id=author_id))
+
+
+def invalidate_author_recipes(author_id):
+    invalidate(AUTHOR_RECIPES_VERSION.format(id=author_id))
+
+
+def invalidate_tags(tag_ids):
+    invalidate(*[TAG_VERSION.format(id=id) for id in tag_ids])
+
+
+def invalidate_table(name):
+    invalidate(TABLE_VERSION.format(name=name))
+
+
+def increment(key, delta=1):
+    if not delta:
+        return
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+
+
+def get_counters(*keys):
+    counters = cache.get_many(keys)
+    return {key: counters.get(key, 0) for key in keys}
+
+
+def hit_stats(hits_key, misses_key):
+    counters = get_counters(hits_key, misses_key)
+    hits = counters[hits_key]
+    misses = counters[misses_key]
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0
+    }
+
+
+def get_cache_stats():
+    return {
+        'recipe_documents': hit_stats(DOCUMENT_HITS, DOCUMENT_MISSES),
+        'anonymous_responses': dict(
+            hit_stats(RESPONSE_HITS, RESPONSE_MISSES),
+            bytes_served=get_counters(RESPONSE_BYTES)[RESPONSE_BYTES]
+        ),
+        'process_local': is_process_local_cache()
+    }
+
+
+def is_process_local_cache():
+    return isinstance(caches['default'], LocMemCache)
+
+
+def log_change(name, value):
+    def append():
+        key = CHANGE_LOG_VERSION.format(name=name)
+        cache.add(key, new_version(), None)
+        cache.set(
+            CHANGE_LOG_ENTRY.format(name=name, number=cache.incr(key)),
+            value,
+            CHANGE_LOG_TIMEOUT
+        )
+    transaction.on_commit(append)
+
+
+def get_change_log_version(name):
+    return cache.get(CHANGE_LOG_VERSION.format(name=name), 0)
+
+
+def get_change_log(name, since):
+    version = get_change_log_version(name)
+    if not since <= version <= since + CHANGE_LOG_LIMIT:
+        return version, None
+    keys = [
+        CHANGE_LOG_ENTRY.format(name=name, number=number)
+        for number in range(since + 1, version + 1)
+    ]
+    entries = cache.get_many(keys)
+    if len(entries) < len(keys):
+        return version, None
+    return version, [entries[key] for key in keys]
+
+
+def record_recipe_changes(ids):
+    log_change(RECIPE_LOG, list(ids))
+
+
+def record_favorite_changes(ids):
+    log_change(FAVORITES_LOG, list(ids))
+
+
+class ChangeLogIndex(ABC):
+    log = RECIPE_LOG
+    hint_logs = ()
+    rebuild_interval = INDEX_REBUILD_INTERVAL
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.versions = {}
+        self.built = 0
+        self.rebuilder = None
+
+    @abstractmethod
+    def build(self):
+        pass
+
+    @abstractmethod
+    def apply(self, ids):
+        pass
+
+    def current_versions(self):
+        return {
+            name: get_change_log_version(name)
+            for name in (self.log,) + self.hint_logs
+        }
+
+    def read_logs(self):
+        versions = {}
+        ids = set()
+        for name in (self.log,) + self.hint_logs:
+            versions[name], entries = get_change_log(
+                name, self.versions.get(name, 0)
+            )
+            if entries is None and name == self.log:
+                return None, None
+            ids.update(*entries or [])
+        return versions, ids
+
+    def install(self, versions, index):
+        self.index = index
+        self.versions = versions
+        self.built = time.monotonic()
+
+    def rebuild(self):
+        try:
+            versions = self.current_versions()
+            index = self.build()
+            with self.lock:
+                self.install(versions, index)
+        finally:
+            connection.close()
+
+    def start_rebuild(self):
+        if self.rebuilder is None or not self.rebuilder.is_alive():
+            self.rebuilder = threading.Thread(
+                target=self.rebuild, name=f'{type(self).__name__}-rebuild',
+                daemon=True
+            )
+            self.rebuilder.start()
+
+    def is_expired(self):
+        return (
+            self.rebuild_interval is not None
+            and time.monotonic() - self.built > self.rebuild_interval
+        )
+
+    def refresh(self):
+        versions, ids = self.read_logs()
+        if versions is None or self.is_expired():
+            self.start_rebuild()
+        if versions is not None:
+            if ids:
+                self.apply(ids)
+            self.versions = versions
+
+    def query(self, search, fallback):
+        with self.lock:
+            if self.index is None:
+                self.start_rebuild()
+            else:
+                self.refresh()
+                return search(self.index)
+        return fallback()
+
+
+class RequestCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def get(self, key, compute):
+        with self.lock:
+            if key in self.values:
+                return self.values[key]
+        value = compute()
+        with self.lock:
+            return self.values.setdefault(key, value)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+request_local = threading.local()
+
+
+@contextmanager
+def request_context(request_cache):
+    request_local.cache = request_cache
+    try:
+        yield request_cache
+    finally:
+        request_local.cache = None
+
+
+def request_cached(key, compute):
+    request_cache = getattr(request_local, 'cache', None)
+    if request_cache is None:
+        return compute()
+    return request_cache.get(key, compute)
+
+
+def get_table_version(name):
+    key = TABLE_VERSION.format(name=name)
+    return get_versions([key])[key], get_modified([key])
+
+
+def get_tables_cache(names, key, build, timeout=None):
+    keys = [TABLE_VERSION.format(name=name) for name in names]
+    versions = get_versions(keys)
+    key = TABLE_CACHE.format(
+        names=','.join(names),
+        key=key,
+        versions=':'.join(str(versions[version]) for version in keys)
+    )
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
+
+
+def get_table_cache(name, key, build):
+    return get_tables_cache([name], key, build)
+
+
+def document_tables():
+    return [TABLE_VERSION.format(name=name) for name in DOCUMENT_TABLES]
+
+
+def document_dependencies(recipes):
+    return document_tables() + list({
+        AUTHOR_VERSION.format(id=recipe.author_id) for recipe in recipes
+    })
+
+
+def document_keys(recipes, variant=''):
+    tables = document_tables()
+    recipe_keys = {
+        recipe.id: RECIPE_VERSION.format(id=recipe.id) for recipe in recipes
+    }
+    author_keys = {
+        recipe.author_id: AUTHOR_VERSION.format(id=recipe.author_id)
+        for recipe in recipes
+    }
+    versions = get_versions(
+        tables + list(recipe_keys.values()) + list(author_keys.values())
+    )
+    tables_version = ':'.join(str(versions[key]) for key in tables)
+    return {
+        recipe.id: DOCUMENT.format(
+            id=recipe.id,
+            versions=(
+                f'{versions[recipe_keys[recipe.id]]}:'
+                f'{versions[author_keys[recipe.author_id]]}:'
+                f'{tables_version}'
+            ),
+            variant=variant
+        )
+        for recipe in recipes
+    }
+
+
+def get_recipe_documents(recipes, keys, build):
+    documents = cache.get_many(list(keys.values()))
+    missing = [id for id, key in keys.items() if key not in documents]
+    increment(DOCUMENT_HITS, len(keys) - len(missing))
+    increment(DOCUMENT_MISSES, len(missing))
+    if missing:
+        built = {
+            keys[id]: document for id, document in build(missing).items()
+        }
+        cache.set_many(built, settings.RECIPE_DOCUMENT_CACHE_TIMEOUT)
+        documents.update(built)
+    return [documents[keys[recipe.id]] for recipe in recipes]
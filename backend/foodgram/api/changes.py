@@ -0,0 +1,92 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import APIException, ValidationError
+
+from recipes.models import RecipeTombstone
+
+INVALID_TOKEN = 'Неверный токен синхронизации'
+EXPIRED_TOKEN = 'Токен синхронизации устарел, выполните полную синхронизацию'
+TOKEN_PARAM = 'since'
+
+
+class TokenExpired(APIException):
+    status_code = 410
+    default_detail = EXPIRED_TOKEN
+    default_code = 'token_expired'
+
+
+def encode_token(key):
+    moment, id = key
+    return base64.urlsafe_b64encode(
+        json.dumps([moment.isoformat(), id]).encode()
+    ).decode()
+
+
+def decode_token(token):
+    try:
+        moment, id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        moment = parse_datetime(moment)
+    except (binascii.Error, TypeError, ValueError):
+        raise ValidationError({TOKEN_PARAM: [INVALID_TOKEN]})
+    if (moment is None or timezone.is_naive(moment)
+            or not isinstance(id, int)):
+        raise ValidationError({TOKEN_PARAM: [INVALID_TOKEN]})
+    if moment < timezone.now() - timedelta(
+            days=settings.RECIPE_TOMBSTONE_DAYS):
+        raise TokenExpired()
+    return moment, id
+
+
+def changed_after(moment_field, id_field, key):
+    moment, id = key
+    return Q(**{f'{moment_field}__gt': moment}) | Q(**{
+        moment_field: moment, f'{id_field}__gt': id
+    })
+
+
+def get_changes(queryset, token, limit):
+    until = timezone.now() - timedelta(seconds=settings.RECIPE_CHANGES_DELAY)
+    recipes = queryset.filter(updated_at__lte=until)
+    tombstones = RecipeTombstone.objects.filter(deleted_at__lte=until)
+    if token:
+        since = decode_token(token)
+        recipes = recipes.filter(changed_after('updated_at', 'id', since))
+        tombstones = tombstones.filter(
+            changed_after('deleted_at', 'recipe_id', since)
+        )
+    else:
+        tombstones = tombstones.none()
+    changes = sorted([
+        ((recipe.updated_at, recipe.id), recipe)
+        for recipe in recipes.order_by('updated_at', 'id')[:limit + 1]
+    ] + [
+        ((deleted_at, recipe_id), None)
+        for deleted_at, recipe_id in tombstones.order_by(
+            'deleted_at', 'recipe_id'
+        ).values_list('deleted_at', 'recipe_id')[:limit + 1]
+    ], key=lambda change: change[0])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if has_more:
+        last = changes[-1][0]
+    else:
+        last = max([(until, 0)] + [key for key, recipe in changes[-1:]])
+    return {
+        'changes': [recipe for key, recipe in changes if recipe is not None],
+        'deleted': [key[1] for key, recipe in changes if recipe is None],
+        'next': encode_token(last),
+        'has_more': has_more
+    }
+
+
+def prune_tombstones(days):
+    return RecipeTombstone.objects.filter(
+        deleted_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()[0]
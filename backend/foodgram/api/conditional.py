@@ -0,0 +1,60 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from api.cache import TABLE_VERSION, get_table_version
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+class ConditionalMixin:
+    etag = None
+    last_modified = None
+
+    def get_not_modified_response(self, request, etag, last_modified=None):
+        self.etag = etag
+        self.last_modified = last_modified
+        return get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.etag and response.status_code in (200, 304):
+            response['ETag'] = self.etag
+            if self.last_modified:
+                response['Last-Modified'] = http_date(self.last_modified)
+        return response
+
+
+class TableVersionMixin(ConditionalMixin):
+    version_table = None
+
+    def check_not_modified(self, request):
+        self.response_dependencies = [
+            TABLE_VERSION.format(name=self.version_table)
+        ]
+        version, modified = get_table_version(self.version_table)
+        return self.get_not_modified_response(
+            request,
+            make_etag(
+                self.version_table,
+                version,
+                sorted(self.kwargs.items()),
+                sorted(request.query_params.lists())
+            ),
+            modified
+        )
+
+    def list(self, request, *args, **kwargs):
+        return (self.check_not_modified(request)
+                or super().list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return (self.check_not_modified(request)
+                or super().retrieve(request, *args, **kwargs))
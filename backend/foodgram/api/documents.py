@@ -0,0 +1,217 @@
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+
+from api.cache import get_recipe_documents, request_cached
+from api.serializers import (
+    AuthorSerializer,
+    RecipeDocumentSerializer,
+    RecipeListSerializer
+)
+from api.utils import annotate_user_flags
+from foodgram.settings import BASE_URL
+from recipes.models import (
+    IngredientInRecipe,
+    Recipe,
+    RecipeCard,
+    TagInRecipe
+)
+
+USER_FLAGS = ['is_favorited', 'is_in_shopping_cart', 'author_is_subscribed']
+FLAG_FIELDS = {'author', 'is_favorited', 'is_in_shopping_cart'}
+RECIPE_FIELDS = RecipeListSerializer.Meta.fields
+DOCUMENT_FIELDS = RecipeDocumentSerializer.Meta.fields
+DOCUMENT_COLUMNS = {
+    'name': ['name'],
+    'image': ['image'],
+    'text': ['text'],
+    'cooking_time': ['cooking_time'],
+    'author': [f'author__{field}' for field in AuthorSerializer.Meta.fields]
+}
+DOCUMENT_PREFETCHES = {
+    'tags': lambda: 'tags',
+    'ingredients': lambda: Prefetch(
+        'ingredientinrecipe_set',
+        queryset=(IngredientInRecipe.objects
+                  .select_related('ingredient')
+                  .order_by('id'))
+    )
+}
+AUTHOR_FIELDS = AuthorSerializer.Meta.fields
+TAG_FIELDS = ['id', 'name', 'color', 'slug']
+INGREDIENT_FIELDS = ['id', 'name', 'measurement_unit']
+VALUE_GETTERS = {
+    'id': lambda row, related: row['id'],
+    'tags': lambda row, related: related['tags'].get(row['id'], []),
+    'author': lambda row, related: {
+        field: row[f'author__{field}'] for field in AUTHOR_FIELDS
+    },
+    'ingredients': (
+        lambda row, related: related['ingredients'].get(row['id'], [])
+    ),
+    'name': lambda row, related: row['name'],
+    'image': lambda row, related: f'{BASE_URL}{row["image"]}',
+    'text': lambda row, related: row['text'],
+    'cooking_time': lambda row, related: row['cooking_time']
+}
+
+
+def document_fields(fields):
+    return [field for field in fields if field in DOCUMENT_FIELDS]
+
+
+def document_variant(fields):
+    fields = document_fields(fields)
+    if fields == DOCUMENT_FIELDS:
+        return ''
+    return ':' + ','.join(fields)
+
+
+def recipe_documents_queryset(fields=DOCUMENT_FIELDS):
+    queryset = Recipe.objects.all()
+    if 'author' in fields:
+        queryset = queryset.select_related('author')
+    if fields != DOCUMENT_FIELDS:
+        queryset = queryset.only('id', 'author', *[
+            column for field in fields
+            for column in DOCUMENT_COLUMNS.get(field, [])
+        ])
+    return queryset.prefetch_related(*[
+        DOCUMENT_PREFETCHES[field]() for field in fields
+        if field in DOCUMENT_PREFETCHES
+    ])
+
+
+def build_recipe_documents(ids, fields=DOCUMENT_FIELDS):
+    return {
+        recipe.id: dict(RecipeDocumentSerializer(recipe, fields=fields).data)
+        for recipe in recipe_documents_queryset(fields).filter(id__in=ids)
+    }
+
+
+def group_tags(ids):
+    tags = {}
+    for row in (TagInRecipe.objects
+                .filter(recipe_id__in=ids)
+                .order_by('tag__name')
+                .values('recipe_id', *[f'tag__{f}' for f in TAG_FIELDS])):
+        tags.setdefault(row['recipe_id'], []).append(
+            {field: row[f'tag__{field}'] for field in TAG_FIELDS}
+        )
+    return tags
+
+
+def group_ingredients(ids):
+    ingredients = {}
+    for row in (IngredientInRecipe.objects
+                .filter(recipe_id__in=ids)
+                .order_by('id')
+                .values('recipe_id', 'amount', *[
+                    f'ingredient__{field}' for field in INGREDIENT_FIELDS
+                ])):
+        ingredients.setdefault(row['recipe_id'], []).append({
+            'id': str(row['ingredient__id']),
+            'name': row['ingredient__name'],
+            'measurement_unit': row['ingredient__measurement_unit'],
+            'amount': row['amount']
+        })
+    return ingredients
+
+
+def build_values_documents(ids, fields=DOCUMENT_FIELDS):
+    related = {
+        'tags': group_tags(ids) if 'tags' in fields else {},
+        'ingredients': (
+            group_ingredients(ids) if 'ingredients' in fields else {}
+        )
+    }
+    return {
+        row['id']: {
+            field: VALUE_GETTERS[field](row, related) for field in fields
+        }
+        for row in Recipe.objects.filter(id__in=ids).values('id', *[
+            column for field in fields
+            for column in DOCUMENT_COLUMNS.get(field, [])
+        ])
+    }
+
+
+def build_recipe_cards(ids):
+    return [
+        RecipeCard(
+            recipe_id=id,
+            author_id=document['author']['id'],
+            tags=','.join(tag['slug'] for tag in document['tags']),
+            payload=json.dumps(document, ensure_ascii=False)
+        )
+        for id, document in build_values_documents(ids).items()
+    ]
+
+
+@transaction.atomic
+def refresh_recipe_cards(ids):
+    ids = list(ids)
+    RecipeCard.objects.filter(recipe_id__in=ids).delete()
+    return RecipeCard.objects.bulk_create(build_recipe_cards(ids))
+
+
+def build_card_documents(ids, fields=DOCUMENT_FIELDS):
+    documents = {}
+    for id, payload in (RecipeCard.objects
+                        .filter(recipe_id__in=ids)
+                        .values_list('recipe_id', 'payload')):
+        document = json.loads(payload)
+        documents[id] = {field: document[field] for field in fields}
+    missing = [id for id in ids if id not in documents]
+    if missing:
+        documents.update(build_values_documents(missing, fields))
+    return documents
+
+
+DOCUMENT_BUILDERS = {
+    'serializer': build_recipe_documents,
+    'values': build_values_documents,
+    'cards': build_card_documents
+}
+
+
+def get_user_flags(user, recipes, fields=RECIPE_FIELDS):
+    if user.is_anonymous or not recipes or not FLAG_FIELDS & set(fields):
+        return {recipe.id: dict.fromkeys(USER_FLAGS, False)
+                for recipe in recipes}
+    ids = [recipe.id for recipe in recipes]
+    return request_cached(('user_flags', user.id, frozenset(ids)), lambda: {
+        flags.pop('id'): flags
+        for flags in annotate_user_flags(
+            Recipe.objects.filter(id__in=ids), user
+        ).values('id', *USER_FLAGS)
+    })
+
+
+def add_user_flags(document, flags, fields=RECIPE_FIELDS):
+    document = dict(document)
+    if 'author' in document:
+        document['author'] = {
+            **document['author'],
+            'is_subscribed': flags['author_is_subscribed']
+        }
+    for flag in ['is_favorited', 'is_in_shopping_cart']:
+        if flag in fields:
+            document[flag] = flags[flag]
+    return document
+
+
+def get_documents(recipes, keys, flags, fields=RECIPE_FIELDS):
+    documents = get_recipe_documents(
+        recipes,
+        keys,
+        lambda ids: DOCUMENT_BUILDERS[settings.RECIPE_DOCUMENT_BUILDER](
+            ids, document_fields(fields)
+        )
+    )
+    return [
+        add_user_flags(document, flags[recipe.id], fields)
+        for recipe, document in zip(recipes, documents)
+    ]
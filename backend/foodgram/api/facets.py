@@ -0,0 +1,82 @@
+import hashlib
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from api.cache import get_tables_cache
+from api.filters import get_tag_registry
+from recipes.models import TagInRecipe, tags_mask
+
+FACETS_TABLES = ['recipes', 'tags']
+USER_FILTERS = ['is_favorited', 'is_in_shopping_cart']
+COOKING_TIME_BUCKETS = [(1, 15), (16, 30), (31, 60), (61, None)]
+
+
+def cooking_time_bucket():
+    return Case(
+        *[
+            When(cooking_time__lte=maximum, then=Value(number))
+            for number, (minimum, maximum) in enumerate(COOKING_TIME_BUCKETS)
+            if maximum is not None
+        ],
+        default=Value(len(COOKING_TIME_BUCKETS) - 1),
+        output_field=IntegerField()
+    )
+
+
+def count_overflow_tags(queryset, registry):
+    overflow = [id for id, bit in registry.values() if bit is None]
+    if not overflow:
+        return {}
+    return dict(
+        TagInRecipe.objects
+        .filter(tag_id__in=overflow, recipe__in=queryset.values('id'))
+        .values_list('tag_id')
+        .annotate(count=Count('id'))
+    )
+
+
+def count_facets(queryset):
+    registry = get_tag_registry()
+    groups = list(
+        queryset.order_by()
+        .values('tags_mask', bucket=cooking_time_bucket())
+        .annotate(count=Count('id'))
+    )
+    overflow = count_overflow_tags(queryset, registry)
+    histogram = [0] * len(COOKING_TIME_BUCKETS)
+    for group in groups:
+        histogram[group['bucket']] += group['count']
+    return {
+        'count': sum(histogram),
+        'tags': [
+            {
+                'slug': slug,
+                'count': overflow.get(id, 0) if bit is None else sum(
+                    group['count'] for group in groups
+                    if group['tags_mask'] & tags_mask([bit])
+                )
+            }
+            for slug, (id, bit) in registry.items()
+        ],
+        'cooking_time': [
+            {'min': minimum, 'max': maximum, 'count': count}
+            for (minimum, maximum), count in zip(
+                COOKING_TIME_BUCKETS, histogram
+            )
+        ]
+    }
+
+
+def get_recipe_facets(queryset, request):
+    if not request.user.is_anonymous and any(
+            name in request.query_params for name in USER_FILTERS):
+        return count_facets(queryset)
+    return get_tables_cache(
+        FACETS_TABLES,
+        'facets:' + hashlib.md5(
+            repr(sorted(request.query_params.lists())).encode()
+        ).hexdigest(),
+        lambda: count_facets(queryset),
+        settings.RECIPE_FACETS_CACHE_TIMEOUT
+    )
@@ -1,17 +1,76 @@
 import django_filters
+from django.db.models import Exists, OuterRef, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Ingredient, Recipe
+from api.cache import get_table_cache
+from api.search import search_recipes
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag,
+    TagInRecipe,
+    tags_mask
+)
+
+UNKNOWN_ORDERING = 'Неизвестная сортировка: {ordering}'
+RECIPE_ORDERINGS = {
+    '-pub_date': ('-pub_date', '-id'),
+    '-favorites_count': ('-favorites_count', '-id'),
+    'cooking_time': ('cooking_time', 'id')
+}
 
 
 def filter_user_recipes_in_model(queryset, user, model, value):
+    if value is None:
+        return queryset
+    if user.is_anonymous:
+        return queryset.none() if value else queryset
+    recipe_ids = model.objects.filter(user=user).values('recipe_id')
     if value:
-        return queryset.filter(**{model + '__user': user})
-    return queryset
+        return queryset.filter(id__in=recipe_ids)
+    return queryset.exclude(id__in=recipe_ids)
+
+
+def get_tag_registry():
+    return get_table_cache('tags', 'registry', lambda: {
+        slug: (id, bit)
+        for slug, id, bit in Tag.objects.values_list('slug', 'id', 'bit')
+    })
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_registry()]
+
+
+def filter_recipes_by_tags(queryset, slugs):
+    registry = get_tag_registry()
+    tags = [registry[slug] for slug in slugs if slug in registry]
+    matches = Q(tags_mask__any=tags_mask(bit for id, bit in tags))
+    overflow = [id for id, bit in tags if bit is None]
+    if not overflow:
+        return queryset.filter(matches)
+    return queryset.annotate(has_overflow_tag=Exists(
+        TagInRecipe.objects.filter(recipe=OuterRef('pk'), tag_id__in=overflow)
+    )).filter(matches | Q(has_overflow_tag=True))
 
 
 class RecipeFilter(django_filters.FilterSet):
-    tags = django_filters.AllValuesMultipleFilter(
-        field_name='tags__slug'
+    tags = django_filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='get_tags'
+    )
+
+    search = django_filters.CharFilter(method='get_search')
+    cooking_time_min = django_filters.NumberFilter(
+        field_name='cooking_time',
+        lookup_expr='gte'
+    )
+    cooking_time_max = django_filters.NumberFilter(
+        field_name='cooking_time',
+        lookup_expr='lte'
     )
 
     is_in_shopping_cart = django_filters.BooleanFilter(
@@ -24,19 +83,55 @@ class RecipeFilter(django_filters.FilterSet):
         widget=django_filters.widgets.BooleanWidget
     )
 
+    def get_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return filter_recipes_by_tags(queryset, value)
+
     def get_is_in_shopping_cart(self, queryset, name, value):
         return filter_user_recipes_in_model(
-            queryset, self.request.user, 'shoppingcart', value
+            queryset, self.request.user, ShoppingCart, value
         )
 
     def get_is_favorited(self, queryset, name, value):
         return filter_user_recipes_in_model(
-            queryset, self.request.user, 'favorite', value
+            queryset, self.request.user, Favorite, value
         )
 
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_in_shopping_cart', 'is_favorited']
+        fields = [
+            'tags', 'author', 'is_in_shopping_cart', 'is_favorited',
+            'cooking_time_min', 'cooking_time_max', 'search'
+        ]
+
+
+class RecipeOrderingFilter(BaseFilterBackend):
+    ordering_param = 'ordering'
+    orderings = RECIPE_ORDERINGS
+    default_ordering = '-pub_date'
+    relevance_ordering = ('-search_rank', '-id')
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(
+            self.ordering_param, self.default_ordering
+        )
+        if ordering not in self.orderings:
+            raise ValidationError({self.ordering_param: [
+                UNKNOWN_ORDERING.format(ordering=ordering)
+            ]})
+        return self.orderings[ordering]
+
+    def filter_queryset(self, request, queryset, view):
+        if ('search_rank' in queryset.query.annotations
+                and self.ordering_param not in request.query_params):
+            return queryset.order_by(*self.relevance_ordering)
+        return queryset.order_by(*self.get_ordering(request))
 
 
 class IngredientFilter(django_filters.FilterSet):
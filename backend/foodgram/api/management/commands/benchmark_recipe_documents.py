@@ -0,0 +1,66 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.documents import (
+    DOCUMENT_BUILDERS,
+    DOCUMENT_FIELDS,
+    RECIPE_FIELDS,
+    add_user_flags,
+    get_user_flags
+)
+from api.sql_documents import SQL_BUILDER, get_sql_documents
+from recipes.models import Recipe
+from users.models import User
+
+PAGE_SIZES = [10, 50, 200]
+RESULT_FORMAT = (
+    '{builder:<12} page_size={page_size:<4} '
+    'time={time:.2f}ms queries={queries}'
+)
+
+
+def build_documents(builder, user, recipes):
+    if builder == SQL_BUILDER:
+        return get_sql_documents(user, recipes, RECIPE_FIELDS)
+    documents = DOCUMENT_BUILDERS[builder](
+        [recipe.id for recipe in recipes], DOCUMENT_FIELDS
+    )
+    flags = get_user_flags(user, recipes)
+    return [
+        add_user_flags(documents[recipe.id], flags[recipe.id])
+        for recipe in recipes
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает способы сборки документов рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--username')
+
+    def handle(self, *args, **options):
+        user = AnonymousUser()
+        if options['username']:
+            user = User.objects.get(username=options['username'])
+        for page_size in PAGE_SIZES:
+            recipes = list(
+                Recipe.objects.only('id').order_by('-pub_date')[:page_size]
+            )
+            for builder in [*DOCUMENT_BUILDERS, SQL_BUILDER]:
+                with CaptureQueriesContext(connection) as context:
+                    build_documents(builder, user, recipes)
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    build_documents(builder, user, recipes)
+                self.stdout.write(RESULT_FORMAT.format(
+                    builder=builder,
+                    page_size=page_size,
+                    time=(time.perf_counter() - started)
+                    * 1000 / options['repeat'],
+                    queries=len(context.captured_queries)
+                ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import get_cache_stats, is_process_local_cache
+
+STATS_FORMAT = (
+    '{name}: hits={hits} misses={misses} hit_ratio={hit_ratio:.2%}'
+)
+BYTES_FORMAT = '{name}: bytes_served={bytes_served}'
+STATS_NAMES = (
+    ('recipe_documents', 'recipe documents'),
+    ('anonymous_responses', 'anonymous responses')
+)
+PROCESS_LOCAL_CACHE = (
+    'Кэш по умолчанию LocMemCache хранит счётчики внутри каждого процесса, '
+    'команда не видит статистику воркеров. Настройте общий CACHE_BACKEND '
+    'или смотрите /api/cache/stats/ под администратором'
+)
+
+
+class Command(BaseCommand):
+    help = 'Выводит статистику попаданий в кэш'
+
+    def handle(self, *args, **options):
+        if is_process_local_cache():
+            raise CommandError(PROCESS_LOCAL_CACHE)
+        stats = get_cache_stats()
+        for key, name in STATS_NAMES:
+            self.stdout.write(STATS_FORMAT.format(name=name, **stats[key]))
+        self.stdout.write(BYTES_FORMAT.format(
+            name='anonymous responses', **stats['anonymous_responses']
+        ))
@@ -0,0 +1,80 @@
+import random
+import time
+import tracemalloc
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+
+from api.pantry import IngredientBitsets, load_pantry
+
+SYNTHETIC_INGREDIENTS = 2000
+SYNTHETIC_TAGS = ['breakfast', 'lunch', 'dinner', 'dessert', 'snack']
+STATS_FORMAT = (
+    'recipes={count} build={build:.0f}ms memory={memory:.1f}MiB '
+    'peak={peak:.1f}MiB'
+)
+LATENCY_FORMAT = (
+    'queries={count} pantry={pantry} p50={p50:.3f}ms p99={p99:.3f}ms'
+)
+
+
+def synthetic_recipes(count):
+    generator = random.Random(count)
+    weights = list(accumulate(
+        1 / rank for rank in range(1, SYNTHETIC_INGREDIENTS + 1)
+    ))
+    ingredients = range(1, SYNTHETIC_INGREDIENTS + 1)
+    for id in range(1, count + 1):
+        yield id, tuple(set(generator.choices(
+            ingredients, cum_weights=weights, k=generator.randint(3, 15)
+        ))), tuple(generator.sample(SYNTHETIC_TAGS, generator.randint(0, 2)))
+
+
+class Command(BaseCommand):
+    help = 'Выводит память, время сборки и задержку индекса продуктов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int)
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--pantry', type=int, default=8)
+        parser.add_argument('--tags', action='store_true')
+
+    def handle(self, *args, **options):
+        rows = list(
+            synthetic_recipes(options['synthetic'])
+            if options['synthetic'] else load_pantry()
+        )
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = IngredientBitsets(rows)
+        build = (time.perf_counter() - started) * 1000
+        memory, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(STATS_FORMAT.format(
+            count=len(index),
+            build=build,
+            memory=memory / 2 ** 20,
+            peak=peak / 2 ** 20
+        ))
+        if not rows:
+            return
+        generator = random.Random(0)
+        ingredients = list(index.ingredients)
+        tags = list(index.tags)
+        latencies = []
+        for _ in range(options['queries']):
+            pantry = generator.sample(
+                ingredients, min(options['pantry'], len(ingredients))
+            )
+            started = time.perf_counter()
+            index.search(
+                pantry, generator.sample(tags, 1) if options['tags'] else None
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        self.stdout.write(LATENCY_FORMAT.format(
+            count=len(latencies),
+            pantry=options['pantry'],
+            p50=latencies[len(latencies) // 2],
+            p99=latencies[int(len(latencies) * 0.99)]
+        ))
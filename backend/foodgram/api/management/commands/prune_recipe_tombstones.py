@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.changes import prune_tombstones
+
+PRUNED = 'Удалено записей об удалённых рецептах: {count}'
+
+
+class Command(BaseCommand):
+    help = 'Удаляет устаревшие записи об удалённых рецептах'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.RECIPE_TOMBSTONE_DAYS
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(PRUNED.format(
+            count=prune_tombstones(options['days'])
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.search import get_search_backend
+from recipes.models import Recipe
+
+REBUILT = 'Поисковый индекс пересобран: {count}'
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс рецептов'
+
+    def handle(self, *args, **options):
+        get_search_backend().rebuild()
+        self.stdout.write(REBUILT.format(count=Recipe.objects.count()))
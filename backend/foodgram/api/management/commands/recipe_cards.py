@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.documents import build_recipe_cards, refresh_recipe_cards
+from recipes.models import Recipe, RecipeCard
+
+CARD_COLUMNS = ['author_id', 'tags', 'payload']
+REBUILT = 'Пересобрано карточек: {count}'
+VERIFIED = 'Карточки рецептов совпадают с исходными таблицами: {count}'
+MISSING = 'Нет карточки рецепта {id}'
+STALE = 'Карточка рецепта {id} устарела: {columns}'
+MISMATCHES = 'Найдено расхождений: {count}'
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает или проверяет карточки рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def batches(self, batch_size):
+        ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(ids), batch_size):
+            yield ids[start:start + batch_size]
+
+    def verify(self, ids):
+        cards = RecipeCard.objects.in_bulk(ids)
+        errors = []
+        for expected in build_recipe_cards(ids):
+            card = cards.get(expected.recipe_id)
+            if card is None:
+                errors.append(MISSING.format(id=expected.recipe_id))
+                continue
+            columns = [
+                column for column in CARD_COLUMNS
+                if getattr(card, column) != getattr(expected, column)
+            ]
+            if columns:
+                errors.append(STALE.format(
+                    id=expected.recipe_id, columns=', '.join(columns)
+                ))
+        return errors
+
+    def handle(self, *args, **options):
+        count = 0
+        errors = []
+        for ids in self.batches(options['batch_size']):
+            if options['verify']:
+                errors += self.verify(ids)
+            else:
+                refresh_recipe_cards(ids)
+            count += len(ids)
+        for error in errors:
+            self.stderr.write(error)
+        if errors:
+            raise CommandError(MISMATCHES.format(count=len(errors)))
+        self.stdout.write(
+            (VERIFIED if options['verify'] else REBUILT).format(count=count)
+        )
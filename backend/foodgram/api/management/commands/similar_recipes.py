@@ -0,0 +1,51 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from api.similar import (
+    SIMILAR_LIMIT,
+    IngredientIndex,
+    load_ingredient_sets,
+    rebuild_similar_recipes,
+    top_neighbours
+)
+from recipes.models import SimilarRecipe
+
+REBUILT = 'Пересобраны похожие рецепты: {count}'
+RECALL = 'recall@{limit}={recall:.2%} по {count} рецептам'
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает индекс похожих рецептов или измеряет его полноту'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recall', type=int, metavar='SAMPLE')
+
+    def measure_recall(self, sample):
+        index = IngredientIndex(load_ingredient_sets())
+        recipes = random.Random(sample).sample(
+            sorted(index.sets), min(sample, len(index.sets))
+        )
+        found = 0
+        expected = 0
+        for recipe_id in recipes:
+            exact = {
+                other for other, score in top_neighbours(
+                    index.exact_scores(recipe_id), SIMILAR_LIMIT
+                )
+            }
+            stored = set(SimilarRecipe.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('similar_id', flat=True))
+            found += len(exact & stored)
+            expected += len(exact)
+        self.stdout.write(RECALL.format(
+            limit=SIMILAR_LIMIT,
+            recall=found / expected if expected else 1,
+            count=len(recipes)
+        ))
+
+    def handle(self, *args, **options):
+        if options['recall']:
+            return self.measure_recall(options['recall'])
+        self.stdout.write(REBUILT.format(count=rebuild_similar_recipes()))
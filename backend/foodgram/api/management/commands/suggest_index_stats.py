@@ -0,0 +1,69 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from api.suggest import PrefixIndex, load_recipes
+
+SYNTHETIC_WORDS = [
+    'борщ', 'суп', 'салат', 'пирог', 'каша', 'блины', 'ёжики', 'плов',
+    'котлеты', 'омлет', 'куриный', 'грибной', 'овощной', 'домашний',
+    'летний', 'быстрый', 'сырный', 'томатный', 'Ёлочка', 'с', 'рисом'
+]
+STATS_FORMAT = (
+    'names={count} build={build:.0f}ms memory={memory:.1f}MiB '
+    'peak={peak:.1f}MiB'
+)
+LATENCY_FORMAT = 'queries={count} p50={p50:.3f}ms p99={p99:.3f}ms'
+
+
+def synthetic_recipes(count):
+    generator = random.Random(count)
+    for id in range(1, count + 1):
+        yield id, ' '.join(
+            generator.choice(SYNTHETIC_WORDS)
+            for _ in range(generator.randint(1, 4))
+        ) + f' {id}', generator.randint(0, 1000)
+
+
+class Command(BaseCommand):
+    help = 'Выводит память, время сборки и задержку индекса подсказок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int)
+        parser.add_argument('--queries', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        rows = list(
+            synthetic_recipes(options['synthetic'])
+            if options['synthetic'] else load_recipes()
+        )
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = PrefixIndex(rows)
+        build = (time.perf_counter() - started) * 1000
+        memory, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(STATS_FORMAT.format(
+            count=len(index),
+            build=build,
+            memory=memory / 2 ** 20,
+            peak=peak / 2 ** 20
+        ))
+        if not rows:
+            return
+        generator = random.Random(0)
+        latencies = []
+        for _ in range(options['queries']):
+            name = generator.choice(rows)[1]
+            query = name[:generator.randint(1, min(len(name), 12))]
+            started = time.perf_counter()
+            index.suggest(query, 10)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        self.stdout.write(LATENCY_FORMAT.format(
+            count=len(latencies),
+            p50=latencies[len(latencies) // 2],
+            p99=latencies[int(len(latencies) * 0.99)]
+        ))
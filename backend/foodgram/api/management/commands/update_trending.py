@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.trending import prune_events, rebuild_trending, update_trending
+
+UPDATED = 'Учтено событий: {events}, обновлено рецептов: {recipes}'
+PRUNED = 'Удалено учтённых событий: {count}'
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинг популярных рецептов по новым событиям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true')
+        parser.add_argument('--prune', type=int, metavar='DAYS')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        events, recipes = (
+            rebuild_trending if options['rebuild'] else update_trending
+        )(options['batch_size'])
+        self.stdout.write(UPDATED.format(events=events, recipes=recipes))
+        if options['prune'] is not None:
+            self.stdout.write(PRUNED.format(
+                count=prune_events(options['prune'])
+            ))
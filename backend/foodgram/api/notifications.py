@@ -0,0 +1,153 @@
+import select
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import Throttled
+
+from api.changes import changed_after
+from recipes.models import Recipe
+
+PUBLISHED_CHANNEL = 'recipe_published'
+PUBLICATIONS_SIZE = 1024
+LISTEN_POLL = 5
+LISTEN_RETRY = 1
+TOO_MANY_WAITERS = 'Слишком много ожидающих запросов, повторите позже'
+
+
+class Publications:
+    def __init__(self, size=PUBLICATIONS_SIZE):
+        self.condition = threading.Condition()
+        self.events = deque(maxlen=size)
+        self.number = 0
+
+    def publish(self, author_id):
+        with self.condition:
+            self.number += 1
+            self.events.append((self.number, author_id))
+            self.condition.notify_all()
+
+    def published(self, authors, since):
+        if self.events and self.events[0][0] > since + 1:
+            return True
+        for number, author_id in reversed(self.events):
+            if number <= since:
+                return False
+            if author_id in authors:
+                return True
+        return False
+
+    def wait(self, authors, since, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while not self.published(authors, since):
+                since = self.number
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+
+class PostgreSQLListener(threading.Thread):
+    daemon = True
+
+    def __init__(self, publications):
+        super().__init__(name='recipe-published-listener')
+        self.publications = publications
+
+    def listen(self):
+        listener = connection.get_new_connection(
+            connection.get_connection_params()
+        )
+        listener.autocommit = True
+        try:
+            listener.cursor().execute(f'LISTEN {PUBLISHED_CHANNEL}')
+            while True:
+                if select.select([listener], [], [], LISTEN_POLL)[0]:
+                    listener.poll()
+                while listener.notifies:
+                    self.publications.publish(
+                        int(listener.notifies.pop(0).payload)
+                    )
+        finally:
+            listener.close()
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except (OSError, connection.Database.Error):
+                time.sleep(LISTEN_RETRY)
+
+
+publications = Publications()
+listener_lock = threading.Lock()
+listener = None
+waiters = threading.BoundedSemaphore(settings.SUBSCRIPTION_UPDATES_WAITERS)
+
+
+def start_listener():
+    global listener
+    if connection.vendor != 'postgresql':
+        return
+    with listener_lock:
+        if listener is None:
+            listener = PostgreSQLListener(publications)
+            listener.start()
+
+
+def notify_published(author_id):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)', [PUBLISHED_CHANNEL, str(author_id)]
+            )
+        return
+    transaction.on_commit(lambda: publications.publish(author_id))
+
+
+def new_recipes(authors, since, limit):
+    until = timezone.now() - timedelta(seconds=settings.RECIPE_CHANGES_DELAY)
+    recipes = Recipe.objects.filter(
+        author_id__in=authors, pub_date__lte=until
+    )
+    if since is not None:
+        recipes = recipes.filter(changed_after('pub_date', 'id', since))
+    recipes = list(
+        recipes.only('id', 'name', 'image', 'cooking_time', 'pub_date')
+        .order_by('pub_date', 'id')[:limit]
+    )
+    if len(recipes) == limit:
+        return recipes, (recipes[-1].pub_date, recipes[-1].id)
+    return recipes, max([(until, 0)] + [
+        (recipe.pub_date, recipe.id) for recipe in recipes[-1:]
+    ])
+
+
+def wait_for_recipes(authors, since, timeout, limit):
+    start_listener()
+    deadline = time.monotonic() + timeout
+    number = publications.number
+    recipes, key = new_recipes(authors, since, limit)
+    if recipes or not authors or timeout <= 0:
+        return recipes, key
+    if not waiters.acquire(blocking=False):
+        raise Throttled(wait=timeout, detail=TOO_MANY_WAITERS)
+    try:
+        if not connection.in_atomic_block:
+            connection.close()
+        published = publications.wait(authors, number, timeout)
+        if published:
+            time.sleep(max(0, min(
+                settings.RECIPE_CHANGES_DELAY, deadline - time.monotonic()
+            )))
+    finally:
+        waiters.release()
+    if not published:
+        return recipes, key
+    return new_recipes(authors, since, limit)
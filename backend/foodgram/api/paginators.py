@@ -1,5 +1,203 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+INVALID_CURSOR = 'Неверный курсор'
+CURSOR_MODE = 'cursor'
+STREAM_VALUES = ('1', 'true')
+
+
+def estimate_count(queryset):
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class ApproximateCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        if settings.RECIPES_APPROXIMATE_COUNT:
+            estimate = estimate_count(self.object_list)
+            if (estimate is not None
+                    and estimate >= settings.RECIPES_EXACT_COUNT_LIMIT):
+                return estimate
+        return super().count
+
+
+class KeysetPaginator(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    max_page_size = settings.RECIPES_MAX_PAGE_SIZE
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(queryset.query.order_by) or self.ordering
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size < 1:
+            return self.page_size
+        if self.max_page_size:
+            return min(page_size, self.max_page_size)
+        return page_size
+
+    def encode_cursor(self, item, reverse):
+        values = []
+        for field in self.ordering:
+            value = getattr(item, field.lstrip('-'))
+            values.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value
+            )
+        return base64.urlsafe_b64encode(
+            json.dumps([reverse, values]).encode()
+        ).decode()
+
+    def get_field(self, queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def convert_value(self, queryset, name, value):
+        if value is None or isinstance(value, (dict, list)):
+            raise TypeError(value)
+        return self.get_field(queryset, name).to_python(value)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            reverse, values = json.loads(base64.urlsafe_b64decode(
+                encoded.encode()
+            ))
+            if (not isinstance(values, list)
+                    or len(values) != len(self.ordering)):
+                raise ValueError(values)
+            values = [
+                self.convert_value(queryset, field.lstrip('-'), value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (binascii.Error, FieldDoesNotExist, TypeError, ValueError,
+                ValidationError):
+            raise NotFound(INVALID_CURSOR)
+        return bool(reverse), values
+
+    def keyset_filter(self, values, reverse):
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset, view)
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset)
+        reverse = cursor is not None and cursor[0]
+        ordering = [
+            field.lstrip('-') if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        ] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self.keyset_filter(cursor[1], reverse))
+        page = list(queryset[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if reverse:
+            page.reverse()
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else cursor is not None
+        self.page = page
+        return page
+
+    def get_link(self, item, reverse):
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(item, reverse)
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.page[-1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_link(self.page[0], True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
 
 
 class RecipePaginator(PageNumberPagination):
     page_size_query_param = 'limit'
+    max_page_size = settings.RECIPES_MAX_PAGE_SIZE
+    mode_query_param = 'pagination'
+    stream_query_param = 'stream'
+    django_paginator_class = ApproximateCountPaginator
+    keyset_paginator_class = KeysetPaginator
+
+    def get_stream_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            size = self.page_size
+        if size < 1:
+            size = self.page_size
+        return min(size, settings.RECIPES_MAX_STREAM_SIZE)
+
+    def is_streaming(self, request):
+        return (
+            request.query_params.get(self.stream_query_param) in STREAM_VALUES
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if request.query_params.get(self.mode_query_param) == CURSOR_MODE:
+            self.keyset = self.keyset_paginator_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_page_state(self):
+        if self.keyset is not None:
+            return (
+                self.keyset.get_next_link(),
+                self.keyset.get_previous_link()
+            )
+        return (
+            self.page.paginator.count,
+            self.get_next_link(),
+            self.get_previous_link()
+        )
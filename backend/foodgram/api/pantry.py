@@ -0,0 +1,228 @@
+from array import array
+from bisect import bisect_left
+from itertools import islice
+
+from django.db.models import Count, F, Q
+
+from api.cache import ChangeLogIndex
+from recipes.models import IngredientInRecipe, Recipe, TagInRecipe
+
+PANTRY_LIMIT = 20
+DENSE_RATIO = 32
+
+
+def to_bits(ids, size):
+    bits = bytearray(size // 8 + 1)
+    for id in ids:
+        bits[id >> 3] |= 1 << (id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def iter_bits(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def compress(ids, size):
+    if len(ids) * DENSE_RATIO > size:
+        return to_bits(ids, size)
+    return array('I', sorted(ids))
+
+
+def posting_add(posting, id, size):
+    if isinstance(posting, int):
+        return posting | 1 << id
+    position = bisect_left(posting, id)
+    if position == len(posting) or posting[position] != id:
+        posting.insert(position, id)
+    if len(posting) * DENSE_RATIO > size:
+        return to_bits(posting, size)
+    return posting
+
+
+def posting_discard(posting, id):
+    if isinstance(posting, int):
+        return posting & ~(1 << id)
+    position = bisect_left(posting, id)
+    if position < len(posting) and posting[position] == id:
+        del posting[position]
+    return posting
+
+
+def count_bits(planes, bits):
+    for position, plane in enumerate(planes):
+        planes[position] = plane ^ bits
+        bits &= plane
+        if not bits:
+            return
+    planes.append(bits)
+
+
+def count_equal(planes, value, bits):
+    if value >> len(planes):
+        return 0
+    for position, plane in enumerate(planes):
+        bits &= plane if value >> position & 1 else ~plane
+    return bits
+
+
+def load_pantry(ids=None):
+    ingredients = IngredientInRecipe.objects.all()
+    tags = TagInRecipe.objects.all()
+    if ids is not None:
+        ingredients = ingredients.filter(recipe_id__in=ids)
+        tags = tags.filter(recipe_id__in=ids)
+    recipes = {}
+    for recipe_id, ingredient_id in (ingredients
+                                     .values_list('recipe_id',
+                                                  'ingredient_id')
+                                     .iterator()):
+        recipes.setdefault(recipe_id, (set(), set()))[0].add(ingredient_id)
+    for recipe_id, slug in (tags
+                            .values_list('recipe_id', 'tag__slug')
+                            .iterator()):
+        if recipe_id in recipes:
+            recipes[recipe_id][1].add(slug)
+    return [
+        (id, tuple(recipe_ingredients), tuple(recipe_tags))
+        for id, (recipe_ingredients, recipe_tags) in recipes.items()
+    ]
+
+
+def load_matches(ingredients, tags=None, limit=PANTRY_LIMIT):
+    if not ingredients:
+        return []
+    recipes = Recipe.objects.annotate(
+        total=Count('ingredients'),
+        covered=Count('ingredients', filter=Q(ingredients__in=ingredients))
+    ).filter(covered__gt=0)
+    if tags is not None:
+        recipes = recipes.filter(id__in=TagInRecipe.objects.filter(
+            tag__slug__in=tags
+        ).values('recipe_id'))
+    return list(
+        recipes.annotate(missing=F('total') - F('covered'))
+        .order_by('missing', '-total', 'id')
+        .values_list('id', 'missing')[:limit]
+    )
+
+
+class IngredientBitsets:
+    def __init__(self, rows):
+        self.recipes = {}
+        ingredients = {}
+        tags = {}
+        sizes = {}
+        for id, recipe_ingredients, recipe_tags in rows:
+            self.recipes[id] = (recipe_ingredients, recipe_tags)
+            for ingredient_id in recipe_ingredients:
+                ingredients.setdefault(ingredient_id, []).append(id)
+            for slug in recipe_tags:
+                tags.setdefault(slug, []).append(id)
+            sizes.setdefault(len(recipe_ingredients), []).append(id)
+        self.size = max(self.recipes, default=0) + 1
+        self.ingredients = {
+            key: compress(ids, self.size) for key, ids in ingredients.items()
+        }
+        self.tags = {
+            key: compress(ids, self.size) for key, ids in tags.items()
+        }
+        self.sizes = {
+            key: to_bits(ids, self.size) for key, ids in sizes.items()
+        }
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def bits(self, posting):
+        if isinstance(posting, int):
+            return posting
+        return to_bits(posting, self.size)
+
+    def add(self, id, ingredients, tags):
+        self.remove(id)
+        self.size = max(self.size, id + 1)
+        self.recipes[id] = (ingredients, tags)
+        for postings, keys in ((self.ingredients, ingredients),
+                               (self.tags, tags)):
+            for key in keys:
+                postings[key] = posting_add(
+                    postings.get(key, array('I')), id, self.size
+                )
+        self.sizes[len(ingredients)] = (
+            self.sizes.get(len(ingredients), 0) | 1 << id
+        )
+
+    def remove(self, id):
+        if id not in self.recipes:
+            return
+        ingredients, tags = self.recipes.pop(id)
+        for postings, keys in ((self.ingredients, ingredients),
+                               (self.tags, tags)):
+            for key in keys:
+                posting = posting_discard(postings[key], id)
+                if posting:
+                    postings[key] = posting
+                else:
+                    del postings[key]
+        bits = self.sizes[len(ingredients)] & ~(1 << id)
+        if bits:
+            self.sizes[len(ingredients)] = bits
+        else:
+            del self.sizes[len(ingredients)]
+
+    def tagged(self, tags):
+        bits = 0
+        for slug in tags:
+            if slug in self.tags:
+                bits |= self.bits(self.tags[slug])
+        return bits
+
+    def matches(self, planes, candidates):
+        sizes = sorted(self.sizes, reverse=True)
+        equal = {}
+        for missing in range(max(sizes, default=0)):
+            for size in sizes:
+                covered = size - missing
+                if covered < 1:
+                    break
+                if covered not in equal:
+                    equal[covered] = count_equal(planes, covered, candidates)
+                for id in iter_bits(equal[covered] & self.sizes[size]):
+                    yield id, missing
+
+    def search(self, ingredients, tags=None, limit=PANTRY_LIMIT):
+        planes = []
+        candidates = 0
+        for ingredient_id in set(ingredients):
+            if ingredient_id in self.ingredients:
+                bits = self.bits(self.ingredients[ingredient_id])
+                count_bits(planes, bits)
+                candidates |= bits
+        if tags is not None:
+            candidates &= self.tagged(tags)
+        return list(islice(self.matches(planes, candidates), limit))
+
+
+class PantryIndex(ChangeLogIndex):
+    def build(self):
+        return IngredientBitsets(load_pantry())
+
+    def apply(self, ids):
+        found = set()
+        for id, ingredients, tags in load_pantry(ids):
+            self.index.add(id, ingredients, tags)
+            found.add(id)
+        for id in ids - found:
+            self.index.remove(id)
+
+    def search(self, ingredients, tags=None, limit=PANTRY_LIMIT):
+        return self.query(
+            lambda index: index.search(ingredients, tags, limit),
+            lambda: load_matches(ingredients, tags, limit)
+        )
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,95 @@
+import json
+
+from rest_framework.compat import LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+
+
+RAW_DEPTH = 2
+
+
+class RawJSON(str):
+    pass
+
+
+def contains_raw(data, depth=RAW_DEPTH):
+    if isinstance(data, RawJSON):
+        return True
+    if depth == 0:
+        return False
+    if isinstance(data, dict):
+        data = data.values()
+    elif not isinstance(data, (list, tuple)):
+        return False
+    return any(contains_raw(value, depth - 1) for value in data)
+
+
+def materialize(data):
+    if isinstance(data, RawJSON):
+        return json.loads(data)
+    if isinstance(data, dict):
+        return {key: materialize(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [materialize(value) for value in data]
+    return data
+
+
+def iter_json(data, dumps):
+    if isinstance(data, RawJSON):
+        yield data
+    elif isinstance(data, dict):
+        yield '{'
+        for number, (key, value) in enumerate(data.items()):
+            yield f'{"," if number else ""}{dumps(str(key))}:'
+            yield from iter_json(value, dumps)
+        yield '}'
+    elif isinstance(data, (list, tuple)):
+        yield '['
+        for number, value in enumerate(data):
+            if number:
+                yield ','
+            yield from iter_json(value, dumps)
+        yield ']'
+    else:
+        yield dumps(data)
+
+
+def escape(content):
+    return content.replace('\u2028', '\\u2028').replace(
+        '\u2029', '\\u2029'
+    )
+
+
+class PassthroughJSONRenderer(JSONRenderer):
+    def dumps(self, data):
+        return json.dumps(
+            data,
+            cls=self.encoder_class,
+            ensure_ascii=self.ensure_ascii,
+            allow_nan=not self.strict,
+            separators=SHORT_SEPARATORS if self.compact else LONG_SEPARATORS
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not contains_raw(data):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(
+                materialize(data), accepted_media_type, renderer_context
+            )
+        return escape(''.join(iter_json(data, self.dumps))).encode()
+
+    def stream(self, key, chunks):
+        yield f'{{{self.dumps(key)}:['.encode()
+        separator = ''
+        for documents in chunks:
+            if not documents:
+                continue
+            yield escape(separator + ','.join(
+                ''.join(iter_json(document, self.dumps))
+                if contains_raw(document) else self.dumps(document)
+                for document in documents
+            )).encode()
+            separator = ','
+        yield b']}'
@@ -0,0 +1,130 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from api.cache import (
+    AUTHOR_RECIPES_VERSION,
+    RECIPE_VERSION,
+    RESPONSE,
+    RESPONSE_BYTES,
+    RESPONSE_HITS,
+    RESPONSE_MISSES,
+    TABLE_VERSION,
+    TAG_VERSION,
+    document_dependencies,
+    get_versions,
+    increment
+)
+from api.filters import get_tag_registry
+
+CACHED_ACTIONS = ('list', 'retrieve')
+CACHE_HEADER = 'X-Cache'
+POPULAR_ORDERING = '-favorites_count'
+
+
+def is_cacheable(request, action):
+    return (
+        action in CACHED_ACTIONS
+        and request.method == 'GET'
+        and 'HTTP_AUTHORIZATION' not in request.META
+        and 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+    )
+
+
+def normalized_query(request):
+    return sorted(
+        (name, sorted(values)) for name, values in request.GET.lists()
+    )
+
+
+def response_key(request):
+    return RESPONSE.format(key=hashlib.md5(
+        repr((request.path, normalized_query(request))).encode()
+    ).hexdigest())
+
+
+def recipe_list_dependencies(query_params, recipes):
+    slugs = query_params.getlist('tags')
+    registry = get_tag_registry() if slugs else {}
+    scoped = [
+        TAG_VERSION.format(id=registry[slug][0])
+        for slug in slugs if slug in registry
+    ]
+    if query_params.get('author'):
+        scoped.append(AUTHOR_RECIPES_VERSION.format(
+            id=query_params['author']
+        ))
+    dependencies = document_dependencies(recipes) + (
+        scoped or [TABLE_VERSION.format(name='recipes')]
+    )
+    if query_params.get('ordering') == POPULAR_ORDERING:
+        dependencies.append(TABLE_VERSION.format(name='favorites'))
+    return dependencies
+
+
+def recipe_dependencies(recipe):
+    return document_dependencies([recipe]) + [
+        RECIPE_VERSION.format(id=recipe.id)
+    ]
+
+
+def get_cached_response(request, key):
+    entry = cache.get(key)
+    if entry is None or cache.get_many(
+            list(entry['versions'])) != entry['versions']:
+        increment(RESPONSE_MISSES)
+        return None
+    increment(RESPONSE_HITS)
+    response = get_conditional_response(
+        request, etag=entry['etag'], last_modified=entry['last_modified']
+    )
+    if response is None:
+        increment(RESPONSE_BYTES, len(entry['content']))
+        response = HttpResponse(
+            entry['content'], content_type=entry['content_type']
+        )
+    if entry['etag']:
+        response['ETag'] = entry['etag']
+    if entry['last_modified']:
+        response['Last-Modified'] = http_date(entry['last_modified'])
+    response[CACHE_HEADER] = 'HIT'
+    return response
+
+
+def store_response(key, response, dependencies, etag, last_modified):
+    cache.set(key, {
+        'versions': get_versions(list(set(dependencies))),
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'etag': etag,
+        'last_modified': last_modified
+    }, settings.RESPONSE_CACHE_TIMEOUT)
+
+
+class AnonymousCacheMixin:
+    response_dependencies = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_cacheable(
+                request, self.action_map.get(request.method.lower())):
+            return super().dispatch(request, *args, **kwargs)
+        key = response_key(request)
+        response = get_cached_response(request, key)
+        if response is not None:
+            return response
+        response = super().dispatch(request, *args, **kwargs)
+        if (self.response_dependencies and response.status_code == 200
+                and not response.streaming):
+            store_response(
+                key,
+                response.render(),
+                self.response_dependencies,
+                self.etag,
+                self.last_modified
+            )
+            response[CACHE_HEADER] = 'MISS'
+        return response
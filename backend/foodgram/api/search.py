@@ -0,0 +1,125 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from recipes.models import Recipe
+
+RECIPES = Recipe._meta.db_table
+SEARCH_TABLE = RECIPES + '_search'
+WORDS = re.compile(r'\w+')
+
+
+class SQLiteSearch:
+    def match(self, query):
+        return ' '.join(
+            '"{}"*'.format(word) for word in WORDS.findall(query.lower())
+        )
+
+    def filter(self, queryset, query):
+        match = self.match(query)
+        if not match:
+            return queryset.none()
+        return queryset.annotate(search_match=RawSQL(
+            f'{RECIPES}.id IN (SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s)',
+            [match],
+            output_field=BooleanField()
+        )).filter(search_match=True).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({SEARCH_TABLE}, 10.0, 1.0) FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = {RECIPES}.id',
+            [match],
+            output_field=FloatField()
+        ))
+
+    def index(self, ids):
+        self.remove(ids)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, text) '
+                f'SELECT id, name, text FROM {RECIPES} WHERE id IN ({{}})'
+                .format(', '.join(['%s'] * len(ids))),
+                ids
+            )
+
+    def remove(self, ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({{}})'.format(
+                    ', '.join(['%s'] * len(ids))
+                ),
+                ids
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, text) '
+                f'SELECT id, name, text FROM {RECIPES}'
+            )
+
+
+class PostgreSQLSearch:
+    vector = (
+        "setweight(to_tsvector('russian', name), 'A') || "
+        "setweight(to_tsvector('russian', text), 'B')"
+    )
+    tsquery = "plainto_tsquery('russian', %s)"
+
+    def filter(self, queryset, query):
+        return queryset.annotate(search_match=RawSQL(
+            f'{RECIPES}.search_vector @@ {self.tsquery} '
+            f'OR {RECIPES}.name %% %s',
+            [query, query],
+            output_field=BooleanField()
+        )).filter(search_match=True).annotate(search_rank=Cast(RawSQL(
+            f'ts_rank({RECIPES}.search_vector, {self.tsquery}) '
+            f'+ similarity({RECIPES}.name, %s)',
+            [query, query],
+            output_field=FloatField()
+        ), FloatField()))
+
+    def update(self, where='', params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {RECIPES} SET search_vector = {self.vector}{where}',
+                params
+            )
+
+    def index(self, ids):
+        self.update(
+            ' WHERE id IN ({})'.format(', '.join(['%s'] * len(ids))), ids
+        )
+
+    def remove(self, ids):
+        pass
+
+    def rebuild(self):
+        self.update()
+
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteSearch,
+    'postgresql': PostgreSQLSearch
+}
+
+
+def get_search_backend():
+    return SEARCH_BACKENDS[connection.vendor]()
+
+
+def search_recipes(queryset, query):
+    return get_search_backend().filter(queryset, query)
+
+
+def index_recipes(ids):
+    if ids:
+        get_search_backend().index(list(ids))
+
+
+def remove_recipes(ids):
+    if ids:
+        get_search_backend().remove(list(ids))
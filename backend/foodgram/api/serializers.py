@@ -6,6 +6,7 @@ from django.core.validators import MinValueValidator
 from django.shortcuts import get_object_or_404
 from rest_framework.serializers import (
     BaseSerializer,
+    BooleanField,
     CharField,
     CurrentUserDefault,
     HiddenField,
@@ -17,16 +18,16 @@ from rest_framework.serializers import (
 )
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.cache import invalidate_recipe, request_cached
 from api.filters import RecipeFilter
-from api.utils import check_user_recipe_in_model
 from recipes.models import (
     Ingredient,
     IngredientInRecipe,
-    Favorite,
     Recipe,
     ShoppingCart,
     Tag,
-    TagInRecipe
+    TagInRecipe,
+    tags_mask
 )
 from foodgram.settings import BASE_DIR, BASE_URL, MEDIA_URL
 from users.models import Subscribe, User
@@ -39,9 +40,15 @@ RECIPE_IMAGES = MEDIA_URL + 'recipes/images/'
 SPLIT = ';base64,'
 
 
-class UserSerializer(ModelSerializer):
-    is_subscribed = SerializerMethodField()
+class DynamicFieldsMixin:
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 
+class AuthorSerializer(ModelSerializer):
     class Meta:
         model = User
         fields = [
@@ -49,14 +56,26 @@ class UserSerializer(ModelSerializer):
             'email',
             'username',
             'first_name',
-            'last_name',
-            'is_subscribed'
+            'last_name'
         ]
 
+
+class UserSerializer(AuthorSerializer):
+    is_subscribed = SerializerMethodField()
+
+    class Meta(AuthorSerializer.Meta):
+        fields = AuthorSerializer.Meta.fields + ['is_subscribed']
+
     def get_is_subscribed(self, item):
+        if hasattr(item, 'is_subscribed'):
+            return item.is_subscribed
         user = self.context['request'].user
-        return (user.subscribed.filter(subscribing__id=item.id)
-                .exists()) if not user.is_anonymous else False
+        if user.is_anonymous:
+            return False
+        return request_cached(
+            ('is_subscribed', user.id, item.id),
+            user.subscribed.filter(subscribing__id=item.id).exists
+        )
 
 
 class RecipeSerializerMinified(ModelSerializer):
@@ -65,7 +84,7 @@ class RecipeSerializerMinified(ModelSerializer):
         fields = ['id', 'name', 'image', 'cooking_time']
 
 
-class SubscribeSerializer(ModelSerializer):
+class SubscribeSerializer(DynamicFieldsMixin, ModelSerializer):
     email = CharField(
         source='subscribing.email',
         read_only=True
@@ -110,6 +129,8 @@ class SubscribeSerializer(ModelSerializer):
         ).data
 
     def get_recipes_count(self, item):
+        if hasattr(item, 'recipes_count'):
+            return item.recipes_count
         return item.subscribing.recipes.all().count()
 
     def get_is_subscribed(self, item):
@@ -138,7 +159,7 @@ class IngredientInRecipeSerializer(ModelSerializer):
 class TagSerializer(ModelSerializer):
     class Meta:
         model = Tag
-        fields = '__all__'
+        fields = ['id', 'name', 'color', 'slug']
 
 
 class ImageSerializer(BaseSerializer):
@@ -195,6 +216,8 @@ class RecipeCreateSerializer(ModelSerializer):
                 recipe=recipe,
                 tag=get_object_or_404(Tag, id=tag.id)
             )
+        recipe.tags_mask = tags_mask(tag.bit for tag in tags)
+        recipe.save(update_fields=['tags_mask'])
         for ingredient in ingredients:
             IngredientInRecipe.objects.create(
                 recipe=recipe,
@@ -212,6 +235,7 @@ class RecipeCreateSerializer(ModelSerializer):
             author=self.context.get('request').user
         )
         self.add_tags_ingredients_to_recipe(recipe, tags, ingredients)
+        invalidate_recipe(recipe.id)
         return recipe
 
     def update(self, recipe, validated_data):
@@ -223,43 +247,43 @@ class RecipeCreateSerializer(ModelSerializer):
             validated_data.pop('ingredients')
         )
         recipe.save()
-        return super().update(recipe, validated_data)
+        recipe = super().update(recipe, validated_data)
+        invalidate_recipe(recipe.id)
+        return recipe
 
 
-class RecipeListSerializer(ModelSerializer):
-    ingredients = SerializerMethodField()
-    author = UserSerializer()
+class RecipeDocumentSerializer(DynamicFieldsMixin, ModelSerializer):
+    ingredients = IngredientInRecipeSerializer(
+        source='ingredientinrecipe_set',
+        many=True
+    )
+    author = AuthorSerializer()
     tags = TagSerializer(many=True)
     image = ImageSerializer()
-    is_favorited = SerializerMethodField()
-    is_in_shopping_cart = SerializerMethodField()
 
     class Meta:
         fields = [
             'id', 'tags', 'author', 'ingredients', 'name', 'image',
-            'text', 'cooking_time', 'is_favorited', 'is_in_shopping_cart'
+            'text', 'cooking_time'
         ]
         model = Recipe
-        filter_class = RecipeFilter
 
-    def get_is_favorited(self, item):
-        return check_user_recipe_in_model(
-            self.context['request'].user,
-            item,
-            Favorite
-        )
 
-    def get_is_in_shopping_cart(self, item):
-        return check_user_recipe_in_model(
-            self.context['request'].user,
-            item,
-            ShoppingCart
-        )
+class RecipeListSerializer(RecipeDocumentSerializer):
+    author = SerializerMethodField()
+    is_favorited = BooleanField(read_only=True)
+    is_in_shopping_cart = BooleanField(read_only=True)
 
-    def get_ingredients(self, item):
-        return IngredientInRecipeSerializer(
-            IngredientInRecipe.objects.filter(recipe=item.id), many=True
-        ).data
+    class Meta(RecipeDocumentSerializer.Meta):
+        fields = RecipeDocumentSerializer.Meta.fields + [
+            'is_favorited', 'is_in_shopping_cart'
+        ]
+        filter_class = RecipeFilter
+
+    def get_author(self, item):
+        author = item.author
+        author.is_subscribed = item.author_is_subscribed
+        return UserSerializer(author, context=self.context).data
 
 
 class ShoppingCartSerializer(ModelSerializer):
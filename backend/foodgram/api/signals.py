@@ -0,0 +1,147 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.cache import (
+    invalidate_author,
+    invalidate_author_recipes,
+    invalidate_recipe,
+    invalidate_table,
+    invalidate_tags,
+    record_recipe_changes
+)
+from api.documents import AUTHOR_FIELDS, refresh_recipe_cards
+from api.notifications import notify_published
+from api.search import index_recipes, remove_recipes
+from api.similar import refill_similar_recipes, similar_referrers
+from api.trending import record_event
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeTombstone,
+    ShoppingCart,
+    Tag,
+    TagInRecipe,
+    tags_mask
+)
+from users.models import User
+
+
+def touch_recipes(ids):
+    Recipe.objects.filter(id__in=ids).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate_recipe(instance.id)
+    invalidate_table('recipes')
+    invalidate_author_recipes(instance.author_id)
+    invalidate_tags(instance.tags.values_list('id', flat=True))
+    record_recipe_changes([instance.id])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    index_recipes([instance.id])
+    if created:
+        notify_published(instance.author_id)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_similar_referrers(sender, instance, **kwargs):
+    instance.similar_referrers = similar_referrers(instance.id)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    remove_recipes([instance.id])
+    RecipeTombstone.objects.create(recipe_id=instance.id)
+    referrers = getattr(instance, 'similar_referrers', [])
+    if referrers:
+        transaction.on_commit(lambda: refill_similar_recipes(referrers))
+
+
+def author_fields(user):
+    return tuple(getattr(user, field) for field in AUTHOR_FIELDS)
+
+
+@receiver(pre_save, sender=User)
+def remember_author_fields(sender, instance, update_fields=None, **kwargs):
+    instance.saved_author_fields = None
+    if instance._state.adding or (
+            update_fields is not None
+            and not set(update_fields) & set(AUTHOR_FIELDS)):
+        return
+    instance.saved_author_fields = User.objects.filter(
+        id=instance.id
+    ).values_list(*AUTHOR_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, **kwargs):
+    saved = getattr(instance, 'saved_author_fields', None)
+    if saved is None or saved == author_fields(instance):
+        return
+    invalidate_author(instance.id)
+    ids = list(instance.recipes.values_list('id', flat=True))
+    touch_recipes(ids)
+    refresh_recipe_cards(ids)
+
+
+def refresh_referencing_cards(instance):
+    ids = list(
+        getattr(instance, 'card_recipe_ids', None)
+        or instance.recipe_set.values_list('id', flat=True)
+    )
+    touch_recipes(ids)
+    refresh_recipe_cards(ids)
+    record_recipe_changes(ids)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_card_recipes(sender, instance, **kwargs):
+    instance.card_recipe_ids = list(
+        instance.recipe_set.values_list('id', flat=True)
+    )
+
+
+@receiver(pre_delete, sender=Tag)
+def release_tag_bit(sender, instance, **kwargs):
+    if instance.bit is None:
+        return
+    Recipe.objects.filter(tags_mask__any=tags_mask([instance.bit])).update(
+        tags_mask=F('tags_mask').bitand(~tags_mask([instance.bit]))
+    )
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    invalidate_table('tags')
+    refresh_referencing_cards(instance)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    invalidate_table('ingredients')
+    refresh_referencing_cards(instance)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def recipe_added(sender, instance, created, **kwargs):
+    if created:
+        record_event(sender, instance.recipe_id)
+
+
+@receiver([post_save, post_delete], sender=TagInRecipe)
+def recipe_tags_changed(sender, instance, **kwargs):
+    invalidate_tags([instance.tag_id])
@@ -0,0 +1,201 @@
+import heapq
+
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.models import IngredientInRecipe, SimilarRecipe
+
+SIMILAR_LIMIT = 10
+MAX_POSTING = 1000
+
+
+def jaccard(shared, size, other_size):
+    return shared / (size + other_size - shared)
+
+
+def top_neighbours(scores, limit=SIMILAR_LIMIT):
+    return heapq.nsmallest(
+        limit, scores.items(), key=lambda item: (-item[1], item[0])
+    )
+
+
+def load_ingredient_sets():
+    sets = {}
+    for recipe_id, ingredient_id in (IngredientInRecipe.objects
+                                     .values_list('recipe_id',
+                                                  'ingredient_id')
+                                     .iterator()):
+        sets.setdefault(recipe_id, set()).add(ingredient_id)
+    return sets
+
+
+class IngredientIndex:
+    def __init__(self, sets, max_posting=MAX_POSTING):
+        self.sets = sets
+        self.postings = {}
+        for recipe_id, ingredients in sets.items():
+            for ingredient_id in ingredients:
+                self.postings.setdefault(ingredient_id, []).append(recipe_id)
+        self.postings = {
+            ingredient_id: recipes
+            for ingredient_id, recipes in self.postings.items()
+            if len(recipes) <= max_posting
+        }
+
+    def scores(self, recipe_id):
+        ingredients = self.sets[recipe_id]
+        candidates = {
+            other
+            for ingredient_id in ingredients
+            for other in self.postings.get(ingredient_id, [])
+            if other != recipe_id
+        }
+        return {
+            other: jaccard(
+                len(ingredients & self.sets[other]),
+                len(ingredients),
+                len(self.sets[other])
+            )
+            for other in candidates
+        }
+
+    def exact_scores(self, recipe_id):
+        ingredients = self.sets[recipe_id]
+        return {
+            other: jaccard(
+                len(ingredients & other_ingredients),
+                len(ingredients),
+                len(other_ingredients)
+            )
+            for other, other_ingredients in self.sets.items()
+            if other != recipe_id and ingredients & other_ingredients
+        }
+
+    def neighbours(self, recipe_id, limit=SIMILAR_LIMIT):
+        return top_neighbours(self.scores(recipe_id), limit)
+
+
+def neighbour_rows(recipe_id, neighbours):
+    return [
+        SimilarRecipe(recipe_id=recipe_id, similar_id=other, score=score)
+        for other, score in neighbours
+    ]
+
+
+@transaction.atomic
+def rebuild_similar_recipes(batch_size=1000):
+    index = IngredientIndex(load_ingredient_sets(), MAX_POSTING)
+    SimilarRecipe.objects.all().delete()
+    rows = []
+    for recipe_id in index.sets:
+        rows += neighbour_rows(recipe_id, index.neighbours(recipe_id))
+        if len(rows) >= batch_size:
+            SimilarRecipe.objects.bulk_create(rows)
+            rows = []
+    SimilarRecipe.objects.bulk_create(rows)
+    return len(index.sets)
+
+
+def capped_ingredients(ingredients):
+    return [
+        ingredient_id
+        for ingredient_id, count in IngredientInRecipe.objects
+        .filter(ingredient_id__in=ingredients)
+        .values_list('ingredient_id')
+        .annotate(count=Count('id'))
+        .order_by()
+        if count <= MAX_POSTING
+    ]
+
+
+def get_similarity_scores(recipe_id):
+    ingredients = list(IngredientInRecipe.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', flat=True))
+    candidates = IngredientInRecipe.objects.filter(
+        ingredient_id__in=capped_ingredients(ingredients)
+    ).exclude(recipe_id=recipe_id).values('recipe_id')
+    shared = dict(
+        IngredientInRecipe.objects
+        .filter(recipe_id__in=candidates, ingredient_id__in=ingredients)
+        .values_list('recipe_id')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    sizes = dict(
+        IngredientInRecipe.objects
+        .filter(recipe_id__in=shared)
+        .values_list('recipe_id')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    return {
+        other: jaccard(count, len(ingredients), sizes[other])
+        for other, count in shared.items()
+    }
+
+
+def load_neighbour_lists(ids):
+    lists = {id: {} for id in ids}
+    for recipe_id, similar_id, score in SimilarRecipe.objects.filter(
+            recipe_id__in=ids).values_list('recipe_id', 'similar_id', 'score'):
+        lists[recipe_id][similar_id] = score
+    return lists
+
+
+def merge_neighbour(other, neighbours, recipe_id, score):
+    neighbours = dict(neighbours)
+    previous = neighbours.pop(recipe_id, None)
+    if (previous is not None and (score is None or score < previous)
+            and len(neighbours) + 1 >= SIMILAR_LIMIT):
+        return top_neighbours(get_similarity_scores(other))
+    if score is not None:
+        neighbours[recipe_id] = score
+    return top_neighbours(neighbours)
+
+
+def write_neighbour_lists(lists):
+    SimilarRecipe.objects.filter(recipe_id__in=lists).delete()
+    SimilarRecipe.objects.bulk_create([
+        row
+        for recipe_id, neighbours in lists.items()
+        for row in neighbour_rows(recipe_id, neighbours)
+    ])
+
+
+@transaction.atomic
+def update_similar_recipes(recipe_id):
+    scores = get_similarity_scores(recipe_id)
+    affected = set(scores) | set(SimilarRecipe.objects.filter(
+        similar_id=recipe_id
+    ).values_list('recipe_id', flat=True))
+    lists = load_neighbour_lists(affected | {recipe_id})
+    updated = {recipe_id: top_neighbours(scores)}
+    for other in affected:
+        updated[other] = merge_neighbour(
+            other, lists[other], recipe_id, scores.get(other)
+        )
+    write_neighbour_lists({
+        id: neighbours for id, neighbours in updated.items()
+        if neighbours != top_neighbours(lists[id])
+    })
+
+
+def similar_referrers(recipe_id):
+    return [
+        id for id, count in SimilarRecipe.objects
+        .filter(recipe_id__in=SimilarRecipe.objects.filter(
+            similar_id=recipe_id
+        ).values('recipe_id'))
+        .values_list('recipe_id')
+        .annotate(count=Count('id'))
+        .order_by()
+        if count >= SIMILAR_LIMIT
+    ]
+
+
+@transaction.atomic
+def refill_similar_recipes(ids):
+    write_neighbour_lists({
+        id: top_neighbours(get_similarity_scores(id)) for id in ids
+    })
@@ -0,0 +1,133 @@
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from api.response_cache import normalized_query
+
+FLIGHT_LOCK = 'flight:{key}:lock'
+FLIGHT_RESULT = 'flight:{id}:result'
+FLIGHT_HEADERS = (
+    'HTTP_AUTHORIZATION',
+    'HTTP_ACCEPT',
+    'HTTP_IF_NONE_MATCH',
+    'HTTP_IF_MODIFIED_SINCE'
+)
+FLIGHT_POLL = 0.02
+FLIGHT_MAX_POLL = 0.2
+
+
+def flight_key(request):
+    return hashlib.md5(repr((
+        request.path,
+        normalized_query(request),
+        [request.META.get(header, '') for header in FLIGHT_HEADERS]
+    )).encode()).hexdigest()
+
+
+def snapshot(response):
+    if response.streaming:
+        return None
+    if hasattr(response, 'render'):
+        response.render()
+    return {
+        'status': response.status_code,
+        'content': response.content,
+        'headers': list(response.items())
+    }
+
+
+def restore(result):
+    response = HttpResponse(result['content'], status=result['status'])
+    for name, value in result['headers']:
+        response[name] = value
+    return response
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def follow(self, lock_key):
+        flight_id = cache.get(lock_key)
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT
+        delay = FLIGHT_POLL
+        while flight_id is not None and time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, FLIGHT_MAX_POLL)
+            shared = cache.get(FLIGHT_RESULT.format(id=flight_id))
+            if shared is not None:
+                return shared['response']
+            if cache.get(lock_key) != flight_id:
+                return None
+        return None
+
+    def lead(self, key, compute):
+        lock_key = FLIGHT_LOCK.format(key=key)
+        flight_id = uuid.uuid4().hex
+        if not cache.add(
+                lock_key, flight_id, settings.SINGLE_FLIGHT_LOCK_TIMEOUT):
+            result = self.follow(lock_key)
+            if result is not None:
+                return restore(result), result
+            response = compute()
+            return response, snapshot(response)
+        try:
+            response = compute()
+            result = snapshot(response)
+            cache.set(
+                FLIGHT_RESULT.format(id=flight_id),
+                {'response': result},
+                settings.SINGLE_FLIGHT_WAIT
+            )
+        finally:
+            cache.delete(lock_key)
+        return response, result
+
+    def run(self, key, compute):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+        if not leader:
+            flight.done.wait(settings.SINGLE_FLIGHT_WAIT)
+            if flight.result is None:
+                return compute()
+            return restore(flight.result)
+        try:
+            response, flight.result = self.lead(key, compute)
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+        return response
+
+
+single_flight = SingleFlight()
+
+
+class SingleFlightMixin:
+    single_flight_actions = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if (request.method != 'GET' or self.action_map.get('get')
+                not in self.single_flight_actions):
+            return super().dispatch(request, *args, **kwargs)
+        return single_flight.run(
+            flight_key(request),
+            lambda: super(SingleFlightMixin, self).dispatch(
+                request, *args, **kwargs
+            )
+        )
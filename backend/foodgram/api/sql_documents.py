@@ -0,0 +1,157 @@
+from django.db import connection
+
+from api.renderers import RawJSON
+from foodgram.settings import BASE_URL
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag,
+    TagInRecipe
+)
+from users.models import Subscribe, User
+
+SQL_BUILDER = 'sql'
+RECIPES = Recipe._meta.db_table
+TAGS_SELECT = (
+    'SELECT {object} AS value FROM ' + Tag._meta.db_table + ' tag '
+    'JOIN ' + TagInRecipe._meta.db_table + ' link ON link.tag_id = tag.id '
+    'WHERE link.recipe_id = recipe.id ORDER BY tag.name'
+)
+INGREDIENTS_SELECT = (
+    'SELECT {object} AS value FROM ' + IngredientInRecipe._meta.db_table
+    + ' link JOIN ' + Ingredient._meta.db_table + ' ingredient '
+    'ON ingredient.id = link.ingredient_id '
+    'WHERE link.recipe_id = recipe.id ORDER BY link.id'
+)
+AUTHOR_JOIN = ' JOIN ' + User._meta.db_table + ' author ' + (
+    'ON author.id = recipe.author_id'
+)
+SUBSCRIBED = (
+    'EXISTS (SELECT 1 FROM ' + Subscribe._meta.db_table + ' subscribe '
+    'WHERE subscribe.user_id = %s '
+    'AND subscribe.subscribing_id = recipe.author_id)'
+)
+IN_MODEL = (
+    'EXISTS (SELECT 1 FROM {table} item '
+    'WHERE item.user_id = %s AND item.recipe_id = recipe.id)'
+)
+
+
+class SQLiteDialect:
+    def object(self, pairs):
+        return 'json_object({})'.format(', '.join(
+            f"'{key}', {value}" for key, value in pairs
+        ))
+
+    def array(self, select):
+        return (
+            'json((SELECT json_group_array(json(item.value)) '
+            f'FROM ({select}) item))'
+        )
+
+    def boolean(self, condition):
+        return f"json(CASE WHEN {condition} THEN 'true' ELSE 'false' END)"
+
+
+class PostgreSQLDialect:
+    def object(self, pairs):
+        return 'json_build_object({})'.format(', '.join(
+            f"'{key}', {value}" for key, value in pairs
+        ))
+
+    def array(self, select):
+        return (
+            "(SELECT COALESCE(json_agg(item.value), '[]'::json) "
+            f'FROM ({select}) item)'
+        )
+
+    def boolean(self, condition):
+        return condition
+
+
+DIALECTS = {
+    'sqlite': SQLiteDialect,
+    'postgresql': PostgreSQLDialect
+}
+
+
+class RecipeJSONQuery:
+    def __init__(self, user, fields, dialect=None):
+        self.user_id = None if user.is_anonymous else user.id
+        self.fields = fields
+        self.dialect = dialect or DIALECTS[connection.vendor]()
+
+    def tags(self):
+        return self.dialect.array(TAGS_SELECT.format(
+            object=self.dialect.object([
+                (field, f'tag.{field}')
+                for field in ['id', 'name', 'color', 'slug']
+            ])
+        )), []
+
+    def author(self):
+        return self.dialect.object([
+            (field, f'author.{field}')
+            for field in ['id', 'email', 'username', 'first_name',
+                          'last_name']
+        ] + [('is_subscribed', self.dialect.boolean(SUBSCRIBED))]), [
+            self.user_id
+        ]
+
+    def ingredients(self):
+        return self.dialect.array(INGREDIENTS_SELECT.format(
+            object=self.dialect.object([
+                ('id', 'CAST(ingredient.id AS TEXT)'),
+                ('name', 'ingredient.name'),
+                ('measurement_unit', 'ingredient.measurement_unit'),
+                ('amount', 'link.amount')
+            ])
+        )), []
+
+    def in_model(self, model):
+        return self.dialect.boolean(
+            IN_MODEL.format(table=model._meta.db_table)
+        ), [self.user_id]
+
+    def field(self, name):
+        if name in ['id', 'name', 'text', 'cooking_time']:
+            return f'recipe.{name}', []
+        if name == 'image':
+            return '%s || recipe.image', [BASE_URL]
+        if name == 'is_favorited':
+            return self.in_model(Favorite)
+        if name == 'is_in_shopping_cart':
+            return self.in_model(ShoppingCart)
+        return getattr(self, name)()
+
+    def as_sql(self, ids):
+        pairs = []
+        params = []
+        for name in self.fields:
+            sql, field_params = self.field(name)
+            pairs.append((name, sql))
+            params += field_params
+        join = AUTHOR_JOIN if 'author' in self.fields else ''
+        placeholders = ', '.join(['%s'] * len(ids))
+        return (
+            f'SELECT recipe.id, CAST({self.dialect.object(pairs)} AS TEXT) '
+            f'FROM {RECIPES} recipe{join} '
+            f'WHERE recipe.id IN ({placeholders})'
+        ), params + list(ids)
+
+    def execute(self, ids):
+        if not ids:
+            return {}
+        with connection.cursor() as cursor:
+            cursor.execute(*self.as_sql(ids))
+            return {id: RawJSON(document) for id, document in cursor}
+
+
+def get_sql_documents(user, recipes, fields):
+    documents = RecipeJSONQuery(user, fields).execute(
+        [recipe.id for recipe in recipes]
+    )
+    return [documents[recipe.id] for recipe in recipes]
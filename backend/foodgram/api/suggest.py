@@ -0,0 +1,162 @@
+import heapq
+from bisect import bisect_left
+
+from api.cache import FAVORITES_LOG, ChangeLogIndex
+from recipes.models import Recipe
+
+TOP_SIZE = 20
+HEAVY_RANGE = 256
+MAX_CHAR = '\U0010ffff'
+FOLD = str.maketrans('ё', 'е')
+
+
+def fold(value):
+    return value.casefold().translate(FOLD)
+
+
+def prefixes(folded):
+    return [folded[:length] for length in range(1, len(folded) + 1)]
+
+
+def load_recipes(ids=None):
+    queryset = Recipe.objects.all()
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    return queryset.values_list('id', 'name', 'favorites_count').iterator()
+
+
+def load_suggestions(query, limit):
+    if not query:
+        return []
+    return list(
+        Recipe.objects.filter(name__istartswith=query)
+        .order_by('-favorites_count', 'name', 'id')
+        .values('id', 'name')[:limit]
+    )
+
+
+class PrefixIndex:
+    def __init__(self, rows):
+        self.names = {}
+        self.folded = {}
+        self.popularity = {}
+        entries = []
+        for id, name, popularity in rows:
+            self.names[id] = name
+            self.folded[id] = fold(name)
+            self.popularity[id] = popularity
+            entries.append((self.folded[id], id))
+        entries.sort()
+        self.keys = [folded for folded, id in entries]
+        self.ids = [id for folded, id in entries]
+        self.top = {}
+        self.build_top()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rank(self, id):
+        return -self.popularity[id], self.folded[id], id
+
+    def range(self, prefix):
+        return (
+            bisect_left(self.keys, prefix),
+            bisect_left(self.keys, prefix + MAX_CHAR)
+        )
+
+    def best(self, prefix, limit):
+        low, high = self.range(prefix)
+        return heapq.nsmallest(limit, self.ids[low:high], key=self.rank)
+
+    def build_top(self):
+        stack = [('', 0, len(self.keys))]
+        while stack:
+            prefix, low, high = stack.pop()
+            length = len(prefix) + 1
+            position = low
+            while position < high:
+                if len(self.keys[position]) < length:
+                    position += 1
+                    continue
+                child = self.keys[position][:length]
+                end = bisect_left(self.keys, child + MAX_CHAR, position, high)
+                if end - position > HEAVY_RANGE:
+                    self.top[child] = heapq.nsmallest(
+                        TOP_SIZE, self.ids[position:end], key=self.rank
+                    )
+                    stack.append((child, position, end))
+                position = end
+
+    def suggest(self, query, limit=TOP_SIZE):
+        prefix = fold(query)
+        if not prefix:
+            return []
+        if prefix in self.top:
+            ids = self.top[prefix][:limit]
+        else:
+            ids = self.best(prefix, limit)
+        return [{'id': id, 'name': self.names[id]} for id in ids]
+
+    def remove(self, id):
+        if id not in self.folded:
+            return
+        folded = self.folded[id]
+        position = bisect_left(self.keys, folded)
+        while self.ids[position] != id:
+            position += 1
+        del self.keys[position]
+        del self.ids[position]
+        for prefix in prefixes(folded):
+            top = self.top.get(prefix)
+            if top is not None and id in top:
+                top.remove(id)
+                if len(top) == TOP_SIZE - 1:
+                    self.top[prefix] = self.best(prefix, TOP_SIZE)
+        del self.names[id]
+        del self.folded[id]
+        del self.popularity[id]
+
+    def add(self, id, name, popularity):
+        self.remove(id)
+        folded = fold(name)
+        self.names[id] = name
+        self.folded[id] = folded
+        self.popularity[id] = popularity
+        position = bisect_left(self.keys, folded)
+        while position < len(self.keys) and (
+                self.keys[position] == folded and self.ids[position] < id):
+            position += 1
+        self.keys.insert(position, folded)
+        self.ids.insert(position, id)
+        for prefix in prefixes(folded):
+            top = self.top.get(prefix)
+            if top is not None:
+                top.append(id)
+                top.sort(key=self.rank)
+                del top[TOP_SIZE:]
+            elif len(range(*self.range(prefix))) > HEAVY_RANGE * 2:
+                self.top[prefix] = self.best(prefix, TOP_SIZE)
+
+
+class SuggestIndex(ChangeLogIndex):
+    hint_logs = (FAVORITES_LOG,)
+
+    def build(self):
+        return PrefixIndex(load_recipes())
+
+    def apply(self, ids):
+        found = set()
+        for id, name, popularity in load_recipes(ids):
+            self.index.add(id, name, popularity)
+            found.add(id)
+        for id in ids - found:
+            self.index.remove(id)
+
+    def suggest(self, query, limit=TOP_SIZE):
+        return self.query(
+            lambda index: index.suggest(query, limit),
+            lambda: load_suggestions(query, limit)
+        )
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,135 @@
+import math
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.changes import changed_after
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeEvent,
+    ShoppingCart,
+    TrendingCheckpoint,
+    TrendingRecipe
+)
+
+TRENDING_EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+TRENDING_ORDERING = ('-trending_score', '-id')
+TRENDING_CHECKPOINT = 1
+EVENT_KINDS = {
+    Favorite: RecipeEvent.FAVORITE,
+    ShoppingCart: RecipeEvent.SHOPPING_CART
+}
+EVENT_WEIGHTS = {
+    RecipeEvent.FAVORITE: 1.0,
+    RecipeEvent.SHOPPING_CART: 0.5
+}
+
+
+def decay_rate():
+    return math.log(2) / settings.TRENDING_HALF_LIFE
+
+
+def elapsed(moment):
+    return (moment - TRENDING_EPOCH).total_seconds()
+
+
+def event_score(kind, created):
+    return math.log(EVENT_WEIGHTS[kind]) + decay_rate() * elapsed(created)
+
+
+def log_add(left, right):
+    if left < right:
+        left, right = right, left
+    return left + math.log1p(math.exp(right - left))
+
+
+def record_event(model, recipe_id):
+    RecipeEvent.objects.create(recipe_id=recipe_id, kind=EVENT_KINDS[model])
+
+
+def get_trending_checkpoint():
+    return TrendingCheckpoint.objects.select_for_update().get_or_create(
+        id=TRENDING_CHECKPOINT,
+        defaults={'created': TRENDING_EPOCH, 'event_id': 0}
+    )[0]
+
+
+def settled_events(checkpoint, until, batch_size):
+    return list(
+        RecipeEvent.objects
+        .filter(created__lte=until)
+        .filter(changed_after(
+            'created', 'id', (checkpoint.created, checkpoint.event_id)
+        ))
+        .order_by('created', 'id')
+        .values_list('id', 'recipe_id', 'kind', 'created')[:batch_size]
+    )
+
+
+def apply_events(events):
+    groups = {}
+    for id, recipe_id, kind, created in events:
+        groups.setdefault(recipe_id, []).append(event_score(kind, created))
+    rows = TrendingRecipe.objects.select_for_update().in_bulk(list(groups))
+    created = []
+    for recipe_id in Recipe.objects.filter(
+            id__in=list(groups)).values_list('id', flat=True):
+        row = rows.get(recipe_id)
+        if row is None:
+            row = TrendingRecipe(recipe_id=recipe_id, score=-math.inf)
+            created.append(row)
+        for score in groups[recipe_id]:
+            row.score = log_add(row.score, score)
+    TrendingRecipe.objects.bulk_update(rows.values(), ['score'])
+    TrendingRecipe.objects.bulk_create(created)
+    return len(groups)
+
+
+@transaction.atomic
+def apply_batch(until, batch_size):
+    checkpoint = get_trending_checkpoint()
+    events = settled_events(checkpoint, until, batch_size)
+    if not events:
+        return 0, 0
+    recipes_count = apply_events(events)
+    checkpoint.event_id, checkpoint.created = events[-1][0], events[-1][3]
+    checkpoint.save()
+    return len(events), recipes_count
+
+
+def update_trending(batch_size=1000):
+    until = timezone.now() - timedelta(seconds=settings.TRENDING_EVENT_DELAY)
+    events_count = recipes_count = 0
+    while True:
+        events, recipes = apply_batch(until, batch_size)
+        if not events:
+            return events_count, recipes_count
+        events_count += events
+        recipes_count += recipes
+
+
+@transaction.atomic
+def rebuild_trending(batch_size=1000):
+    TrendingRecipe.objects.all().delete()
+    TrendingCheckpoint.objects.all().delete()
+    return update_trending(batch_size)
+
+
+@transaction.atomic
+def prune_events(days):
+    checkpoint = get_trending_checkpoint()
+    return RecipeEvent.objects.filter(
+        created__lt=min(
+            checkpoint.created, timezone.now() - timedelta(days=days)
+        )
+    ).delete()[0]
+
+
+def trending_recipes(queryset):
+    return queryset.filter(trending__isnull=False).annotate(
+        trending_score=F('trending__score')
+    ).order_by(*TRENDING_ORDERING)
@@ -2,6 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
 from api.views import (
+    BatchView,
+    CacheStatsView,
     SubscribeViewSet,
     IngredientViewSet,
     RecipeViewSet,
@@ -29,6 +31,8 @@ router_v1.register(
 )
 
 urlpatterns = [
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache_stats'),
     path('', include(router_v1.urls)),
     # path(
     #     'recipes/<int:recipe>/shopping_cart/',
@@ -1,5 +1,96 @@
+from itertools import islice
+
+from django.db.models import BooleanField, Exists, OuterRef, Value
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscribe
+
+UNKNOWN_FIELDS = 'Неизвестные поля: {fields}'
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
 def check_user_recipe_in_model(user, recipe, model):
-    return True if not user.is_anonymous and model.objects.filter(
+    return not user.is_anonymous and model.objects.filter(
         user=user,
         recipe=recipe
-    ) else False
+    ).exists()
+
+
+def annotate_user_flags(queryset, user):
+    if user.is_anonymous:
+        false = Value(False, output_field=BooleanField())
+        return queryset.annotate(
+            is_favorited=false,
+            is_in_shopping_cart=false,
+            author_is_subscribed=false
+        )
+    return queryset.annotate(
+        is_favorited=Exists(Favorite.objects.filter(
+            user=user, recipe=OuterRef('pk')
+        )),
+        is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+            user=user, recipe=OuterRef('pk')
+        )),
+        author_is_subscribed=Exists(Subscribe.objects.filter(
+            user=user, subscribing=OuterRef('author')
+        ))
+    )
+
+
+def get_recipe_flags(user, ids):
+    if user.is_anonymous:
+        favorited = in_cart = subscribed = set()
+    else:
+        favorited = set(Favorite.objects.filter(
+            user=user, recipe_id__in=ids
+        ).order_by().values_list('recipe_id', flat=True))
+        in_cart = set(ShoppingCart.objects.filter(
+            user=user, recipe_id__in=ids
+        ).order_by().values_list('recipe_id', flat=True))
+        subscribed = set(Subscribe.objects.filter(
+            user=user, subscribing__recipes__id__in=ids
+        ).order_by().values_list('subscribing__recipes__id', flat=True))
+    return [
+        {
+            'id': id,
+            'is_favorited': id in favorited,
+            'is_in_shopping_cart': id in in_cart,
+            'author': {'is_subscribed': id in subscribed}
+        }
+        for id in ids
+    ]
+
+
+def parse_fields(query_params, param, available):
+    names = [
+        name.strip() for name in query_params[param].split(',')
+        if name.strip()
+    ]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValidationError(
+            {param: [UNKNOWN_FIELDS.format(fields=', '.join(unknown))]}
+        )
+    return names
+
+
+def get_requested_fields(query_params, available):
+    fields = list(available)
+    names = (
+        parse_fields(query_params, 'fields', available)
+        if 'fields' in query_params else None
+    )
+    if names:
+        fields = [field for field in fields if field in names]
+    if 'omit' not in query_params:
+        return fields
+    names = parse_fields(query_params, 'omit', available)
+    return [field for field in fields if field not in names]
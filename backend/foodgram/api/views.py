@@ -1,15 +1,60 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
-from api.filters import IngredientFilter, RecipeFilter
-from api.paginators import RecipePaginator
+from api.batch import parse_batch, run_batch
+from api.cache import (
+    document_dependencies,
+    document_keys,
+    get_cache_stats,
+    get_modified,
+    invalidate_table,
+    record_favorite_changes
+)
+from api.changes import (
+    TOKEN_PARAM,
+    decode_token,
+    encode_token,
+    get_changes
+)
+from api.conditional import (
+    ConditionalMixin,
+    TableVersionMixin,
+    make_etag
+)
+from api.documents import (
+    RECIPE_FIELDS,
+    document_variant,
+    get_documents,
+    get_user_flags,
+    refresh_recipe_cards
+)
+from api.facets import get_recipe_facets
+from api.filters import (
+    IngredientFilter,
+    RecipeFilter,
+    RecipeOrderingFilter
+)
+from api.notifications import wait_for_recipes
+from api.paginators import KeysetPaginator, RecipePaginator
+from api.pantry import PANTRY_LIMIT, pantry_index
+from api.renderers import PassthroughJSONRenderer
+from api.response_cache import (
+    AnonymousCacheMixin,
+    recipe_dependencies,
+    recipe_list_dependencies
+)
 from api.serializers import (
     IngredientSerializer,
     RecipeCreateSerializer,
@@ -19,12 +64,19 @@ from api.serializers import (
     SubscribeSerializer,
     TagSerializer
 )
+from api.similar import update_similar_recipes
+from api.singleflight import SingleFlightMixin
+from api.sql_documents import SQL_BUILDER, get_sql_documents
+from api.suggest import TOP_SIZE, suggest_index
+from api.trending import trending_recipes
+from api.utils import chunked, get_recipe_flags, get_requested_fields
 from recipes.models import (
     Ingredient,
     IngredientInRecipe,
     Favorite,
     Recipe,
     ShoppingCart,
+    SimilarRecipe,
     Tag
 )
 from users.models import User, Subscribe
@@ -36,46 +88,288 @@ ERROR = 'error'
 FILE_FORMAT = '| {name: <30}| {amount: >10} {unit: <10}\n'
 CONTENT_TYPE = 'text/plain'
 CART_FILENAME = 'cart.txt'
+SUGGEST_LIMIT = 10
+CHANGES_LIMIT = 100
+UPDATES_LIMIT = 20
+UPDATES_MAX_LIMIT = 100
+INVALID_TIMEOUT = 'Параметр timeout должен быть числом секунд'
+CHANGES_MAX_LIMIT = 500
+DOCUMENT_ACTIONS = ['list', 'retrieve', 'trending', 'changes']
+PANTRY_MAX_LIMIT = 100
+PANTRY_INGREDIENTS_INVALID = (
+    'Укажите id ингредиентов через запятую, например ingredients=1,2,3'
+)
+FLAGS_MAX_IDS = 1000
+FLAGS_IDS_INVALID = 'Укажите id рецептов через запятую, например ids=1,2,3'
+FLAGS_TOO_MANY_IDS = 'Можно запросить не больше {limit} рецептов'
+SIMILAR_COLUMNS = ['recipe', 'similar'] + [
+    f'similar__{field}' for field in RecipeSerializerMinified.Meta.fields
+]
+SUBSCRIBING_COLUMNS = ['email', 'username', 'first_name', 'last_name']
 HEADER = ('| Наименование                  | Количество \n' +
           '|-------------------------------|--------------\n')
 
 
-class TagsViewSet(ListModelMixin, RetrieveModelMixin, viewsets.GenericViewSet):
+def get_limit(query_params, default, maximum):
+    try:
+        limit = int(query_params.get('limit', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def get_ids(query_params, name, error):
+    try:
+        return [
+            int(id)
+            for value in query_params.getlist(name)
+            for id in value.split(',') if id.strip()
+        ]
+    except ValueError:
+        raise ValidationError({name: [error]})
+
+
+def get_pantry_ingredients(query_params):
+    return get_ids(query_params, 'ingredients', PANTRY_INGREDIENTS_INVALID)
+
+
+def get_flag_ids(query_params):
+    ids = list(dict.fromkeys(
+        get_ids(query_params, 'ids', FLAGS_IDS_INVALID)
+    ))
+    if len(ids) > FLAGS_MAX_IDS:
+        raise ValidationError(
+            {'ids': [FLAGS_TOO_MANY_IDS.format(limit=FLAGS_MAX_IDS)]}
+        )
+    return ids
+
+
+def get_number(query_params, name, default, error, convert=int):
+    try:
+        return convert(query_params.get(name, default))
+    except ValueError:
+        raise ValidationError({name: [error]})
+
+
+def count_favorite(model, recipe_id, delta):
+    if model is Favorite:
+        Recipe.objects.filter(id=recipe_id).update(
+            favorites_count=F('favorites_count') + delta
+        )
+        record_favorite_changes([recipe_id])
+        invalidate_table('favorites')
+
+
+class TagsViewSet(AnonymousCacheMixin, TableVersionMixin, ListModelMixin,
+                  RetrieveModelMixin, viewsets.GenericViewSet):
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
+    version_table = 'tags'
     lookup_field = 'id'
     pagination_class = None
     permission_classes = (permissions.AllowAny,)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousCacheMixin, SingleFlightMixin,
+                    ConditionalMixin, viewsets.ModelViewSet):
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filter_class = RecipeFilter
     pagination_class = RecipePaginator
-    queryset = Recipe.objects.all()
+    single_flight_actions = ('list', 'retrieve', 'download_shopping_cart')
+    renderer_classes = (PassthroughJSONRenderer, BrowsableAPIRenderer)
+
+    def get_queryset(self):
+        if self.action in DOCUMENT_ACTIONS:
+            return Recipe.objects.only(
+                'id', 'author', 'pub_date', 'updated_at', 'favorites_count',
+                'cooking_time'
+            )
+        return Recipe.objects.all()
+
+    def get_documents(self, recipes):
+        return self.get_documents_builder(recipes, RECIPE_FIELDS)[1]()
+
+    def get_fields(self):
+        return get_requested_fields(self.request.query_params, RECIPE_FIELDS)
+
+    def get_documents_builder(self, recipes, fields):
+        if settings.RECIPE_DOCUMENT_BUILDER == SQL_BUILDER:
+            documents = get_sql_documents(self.request.user, recipes, fields)
+            return [
+                (recipe.updated_at.isoformat(), document)
+                for recipe, document in zip(recipes, documents)
+            ], lambda: documents
+        keys = document_keys(recipes, document_variant(fields))
+        flags = get_user_flags(self.request.user, recipes, fields)
+        return [
+            (keys[recipe.id], recipe.updated_at.isoformat(), flags[recipe.id])
+            for recipe in recipes
+        ], lambda: get_documents(recipes, keys, flags, fields)
+
+    def get_recipes_response(self, recipes, fields, respond, state,
+                             last_modified=None):
+        validator, build = self.get_documents_builder(recipes, fields)
+        return (
+            self.get_not_modified_response(
+                self.request, make_etag(state, validator), last_modified
+            )
+            or respond(build())
+        )
+
+    def get_streaming_response(self, queryset, fields):
+        queryset = queryset[:self.paginator.get_stream_size(self.request)]
+        chunk_size = settings.RECIPES_STREAM_CHUNK
+        return StreamingHttpResponse(
+            PassthroughJSONRenderer().stream('results', (
+                self.get_documents_builder(recipes, fields)[1]()
+                for recipes in chunked(
+                    queryset.iterator(chunk_size=chunk_size), chunk_size
+                )
+            )),
+            content_type=PassthroughJSONRenderer.media_type
+        )
+
+    def list(self, request, *args, **kwargs):
+        fields = self.get_fields()
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator.is_streaming(request):
+            return self.get_streaming_response(queryset, fields)
+        page = self.paginate_queryset(queryset)
+        self.response_dependencies = recipe_list_dependencies(
+            request.query_params, page
+        )
+        return self.get_recipes_response(
+            page,
+            fields,
+            self.get_paginated_response,
+            (sorted(request.query_params.lists()),
+             self.paginator.get_page_state())
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        fields = self.get_fields()
+        recipe = self.get_object()
+        self.response_dependencies = recipe_dependencies(recipe)
+        last_modified = None
+        if request.user.is_anonymous:
+            last_modified = max(
+                int(recipe.updated_at.timestamp()),
+                get_modified(document_dependencies([recipe]))
+            )
+        return self.get_recipes_response(
+            [recipe],
+            fields,
+            lambda documents: Response(documents[0]),
+            recipe.id,
+            last_modified
+        )
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        return serializer.save()
+        recipe = serializer.save()
+        refresh_recipe_cards([recipe.id])
+        transaction.on_commit(lambda: update_similar_recipes(recipe.id))
+        return recipe
 
+    @transaction.atomic
     def perform_update(self, serializer):
-        return serializer.save()
+        recipe = serializer.save()
+        refresh_recipe_cards([recipe.id])
+        transaction.on_commit(lambda: update_similar_recipes(recipe.id))
+        return recipe
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        return Response(RecipeListSerializer(
-            self.perform_create(serializer),
-            context={'request': request}
-        ).data)
+        return Response(
+            self.get_documents([self.perform_create(serializer)])[0]
+        )
 
     def update(self, request, *args, **kwargs):
         serializer = self.get_serializer(self.get_object(), data=request.data)
         serializer.is_valid(raise_exception=True)
-        return Response(RecipeListSerializer(
-            self.perform_update(serializer),
-            context={'request': request}
-        ).data)
+        return Response(
+            self.get_documents([self.perform_update(serializer)])[0]
+        )
+
+    @action(detail=False, permission_classes=(permissions.AllowAny,))
+    def facets(self, request):
+        return Response(get_recipe_facets(
+            self.filter_queryset(Recipe.objects.all()), request
+        ))
+
+    @action(detail=False, permission_classes=(permissions.AllowAny,))
+    def trending(self, request):
+        paginator = KeysetPaginator()
+        page = paginator.paginate_queryset(
+            DjangoFilterBackend().filter_queryset(
+                request, trending_recipes(self.get_queryset()), self
+            ),
+            request,
+            self
+        )
+        return paginator.get_paginated_response(
+            self.get_documents_builder(page, self.get_fields())[1]()
+        )
+
+    @action(detail=False, permission_classes=(permissions.AllowAny,))
+    def changes(self, request):
+        changes = get_changes(
+            self.get_queryset(),
+            request.query_params.get('since'),
+            get_limit(request.query_params, CHANGES_LIMIT, CHANGES_MAX_LIMIT)
+        )
+        changes['changes'] = self.get_documents_builder(
+            changes['changes'], self.get_fields()
+        )[1]()
+        return Response(changes)
+
+    @action(detail=True, permission_classes=(permissions.AllowAny,))
+    def similar(self, request, pk):
+        similar = [
+            row.similar for row in SimilarRecipe.objects
+            .filter(recipe_id=pk)
+            .select_related('similar')
+            .only(*SIMILAR_COLUMNS)
+            .order_by('-score', 'similar_id')
+        ]
+        if not similar:
+            get_object_or_404(Recipe, id=pk)
+        return Response(
+            RecipeSerializerMinified(similar, many=True).data
+        )
+
+    @action(detail=False, permission_classes=(permissions.AllowAny,))
+    def suggest(self, request):
+        return Response(suggest_index.suggest(
+            request.query_params.get('q', ''),
+            get_limit(request.query_params, SUGGEST_LIMIT, TOP_SIZE)
+        ))
+
+    @action(detail=False, permission_classes=(permissions.AllowAny,))
+    def pantry(self, request):
+        matches = pantry_index.search(
+            get_pantry_ingredients(request.query_params),
+            request.query_params.getlist('tags') or None,
+            get_limit(request.query_params, PANTRY_LIMIT, PANTRY_MAX_LIMIT)
+        )
+        recipes = Recipe.objects.only(
+            *RecipeSerializerMinified.Meta.fields
+        ).in_bulk([id for id, missing in matches])
+        return Response([
+            dict(
+                RecipeSerializerMinified(recipes[id]).data,
+                missing_ingredients=missing
+            )
+            for id, missing in matches if id in recipes
+        ])
+
+    @action(detail=False, permission_classes=(permissions.AllowAny,))
+    def flags(self, request):
+        return Response(get_recipe_flags(
+            request.user, get_flag_ids(request.query_params)
+        ))
 
     @action(detail=False, methods=['get'])
     def download_shopping_cart(self, request):
@@ -101,6 +395,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         response.writelines(lines)
         return response
 
+    @transaction.atomic
     def add_remove_recipe_model(self, method, user, model, pk):
         if method == 'POST':
             recipe = self.get_object()
@@ -110,6 +405,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
             if not created:
                 return Response(status=400)
+            count_favorite(model, recipe.id, 1)
             return Response(
                 RecipeSerializerMinified(recipe, many=False).data,
                 status=201
@@ -118,6 +414,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             model,
             user=user.id,
             recipe=pk).delete()
+        count_favorite(model, pk, -1)
         return Response(status=204)
 
     @action(detail=True, methods=['post', 'delete'])
@@ -133,17 +430,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
 
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in DOCUMENT_ACTIONS:
             return RecipeListSerializer
         return RecipeCreateSerializer
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(AnonymousCacheMixin, SingleFlightMixin,
+                        TableVersionMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
+    version_table = 'ingredients'
     filter_backends = (DjangoFilterBackend,)
     pagination_class = None
     filterset_class = IngredientFilter
+    single_flight_actions = ('list',)
     permission_classes = (permissions.AllowAny,)
 
 
@@ -184,5 +484,61 @@ class SubscribeViewSet(ModelViewSet):
             many=False,
             context={'request': request}).data, status=201)
 
+    def get_fields(self):
+        return get_requested_fields(
+            self.request.query_params, SubscribeSerializer.Meta.fields
+        )
+
+    @action(detail=False)
+    def updates(self, request):
+        since = request.query_params.get(TOKEN_PARAM)
+        timeout = get_number(
+            request.query_params, 'timeout',
+            settings.SUBSCRIPTION_UPDATES_TIMEOUT, INVALID_TIMEOUT, float
+        )
+        recipes, key = wait_for_recipes(
+            set(Subscribe.objects.filter(user=request.user).values_list(
+                'subscribing_id', flat=True
+            )),
+            decode_token(since) if since else None,
+            max(0, min(timeout, settings.SUBSCRIPTION_UPDATES_TIMEOUT)),
+            get_limit(request.query_params, UPDATES_LIMIT, UPDATES_MAX_LIMIT)
+        )
+        return Response({
+            'results': RecipeSerializerMinified(recipes, many=True).data,
+            'since': encode_token(key)
+        })
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == 'list':
+            kwargs['fields'] = self.get_fields()
+        return super().get_serializer(*args, **kwargs)
+
     def get_queryset(self):
-        return Subscribe.objects.filter(user=self.request.user)
+        fields = self.get_fields()
+        queryset = (
+            Subscribe.objects
+            .filter(user=self.request.user)
+            .select_related('subscribing')
+            .only('id', 'user', 'subscribing__id', *[
+                f'subscribing__{field}' for field in fields
+                if field in SUBSCRIBING_COLUMNS
+            ])
+        )
+        if 'recipes_count' not in fields:
+            return queryset
+        return queryset.annotate(recipes_count=Count('subscribing__recipes'))
+
+
+class BatchView(APIView):
+    permission_classes = (permissions.AllowAny,)
+
+    def post(self, request):
+        return Response(run_batch(request, parse_batch(request.data)))
+
+
+class CacheStatsView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(get_cache_stats())
@@ -20,7 +20,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'recipes',
-    'api',
+    'api.apps.ApiConfig',
     'rest_framework',
     'django_filters',
     'rest_framework.authtoken',
@@ -69,6 +69,16 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -119,3 +129,45 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 BASE_URL = 'http://51.250.81.3/'
+
+RECIPES_APPROXIMATE_COUNT = (
+    os.getenv('RECIPES_APPROXIMATE_COUNT', default='False') == 'True'
+)
+RECIPES_EXACT_COUNT_LIMIT = int(
+    os.getenv('RECIPES_EXACT_COUNT_LIMIT', default=10000)
+)
+RECIPES_MAX_PAGE_SIZE = int(os.getenv('RECIPES_MAX_PAGE_SIZE', default=100))
+RECIPES_STREAM_CHUNK = int(os.getenv('RECIPES_STREAM_CHUNK', default=100))
+RECIPES_MAX_STREAM_SIZE = int(
+    os.getenv('RECIPES_MAX_STREAM_SIZE', default=5000)
+)
+RECIPE_DOCUMENT_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_DOCUMENT_CACHE_TIMEOUT', default=60 * 60)
+)
+RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('RESPONSE_CACHE_TIMEOUT', default=10 * 60)
+)
+SINGLE_FLIGHT_LOCK_TIMEOUT = int(
+    os.getenv('SINGLE_FLIGHT_LOCK_TIMEOUT', default=30)
+)
+SINGLE_FLIGHT_WAIT = float(os.getenv('SINGLE_FLIGHT_WAIT', default=10))
+RECIPE_FACETS_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_FACETS_CACHE_TIMEOUT', default=10 * 60)
+)
+TRENDING_HALF_LIFE = int(
+    os.getenv('TRENDING_HALF_LIFE', default=24 * 60 * 60)
+)
+TRENDING_EVENT_DELAY = int(os.getenv('TRENDING_EVENT_DELAY', default=5))
+RECIPE_CHANGES_DELAY = int(os.getenv('RECIPE_CHANGES_DELAY', default=5))
+RECIPE_TOMBSTONE_DAYS = int(os.getenv('RECIPE_TOMBSTONE_DAYS', default=30))
+SUBSCRIPTION_UPDATES_TIMEOUT = int(
+    os.getenv('SUBSCRIPTION_UPDATES_TIMEOUT', default=25)
+)
+SUBSCRIPTION_UPDATES_WAITERS = int(
+    os.getenv('SUBSCRIPTION_UPDATES_WAITERS', default=48)
+)
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', default=20))
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', default=4))
+RECIPE_DOCUMENT_BUILDER = os.getenv(
+    'RECIPE_DOCUMENT_BUILDER', default='serializer'
+)
@@ -1,7 +1,10 @@
 from django.contrib import admin
 
 from recipes.models import Ingredient, IngredientInRecipe, Favorite
-from recipes.models import Recipe, ShoppingCart, Tag, TagInRecipe
+from recipes.models import Recipe, RecipeCard, RecipeEvent, RecipeTombstone
+from recipes.models import ShoppingCart
+from recipes.models import Tag, TagInRecipe, TrendingCheckpoint
+from recipes.models import TrendingRecipe
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -22,6 +25,11 @@ admin.site.register(Favorite)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(IngredientInRecipe)
 admin.site.register(Recipe, RecipeAdmin)
+admin.site.register(RecipeCard)
+admin.site.register(RecipeEvent)
+admin.site.register(RecipeTombstone)
 admin.site.register(ShoppingCart)
 admin.site.register(Tag)
 admin.site.register(TagInRecipe)
+admin.site.register(TrendingCheckpoint)
+admin.site.register(TrendingRecipe)
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0012_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeCard',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='recipes.Recipe', verbose_name='Рецепт')),
+                ('tags', models.TextField(blank=True, verbose_name='Слаги тегов')),
+                ('payload', models.TextField(verbose_name='Документ рецепта')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_cards', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Карточка рецепта',
+                'verbose_name_plural': 'Карточки рецептов',
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:19
+
+from django.db import migrations, models
+import recipes.models
+
+
+def fill_tags_mask(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for bit, tag in enumerate(
+            Tag.objects.order_by('id')[:recipes.models.TAG_MASK_BITS]):
+        tag.bit = bit
+        tag.save(update_fields=['bit'])
+    for recipe in Recipe.objects.prefetch_related('tags'):
+        recipe.tags_mask = recipes.models.tags_mask(
+            tag.bit for tag in recipe.tags.all()
+        )
+        recipe.save(update_fields=['tags_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipecard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=recipes.models.BitmaskField(default=0, verbose_name='Маска тегов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, unique=True, verbose_name='Бит в маске тегов'),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_tag_bitmask'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['user', 'recipe'], name='shopping_cart_user_recipe'),
+        ),
+    ]
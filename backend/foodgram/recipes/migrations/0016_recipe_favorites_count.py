@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+
+def fill_favorites_count(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for recipe in Recipe.objects.annotate(count=models.Count('favorite')):
+        recipe.favorites_count = recipe.count
+        recipe.save(update_fields=['favorites_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_shoppingcart_user_recipe_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество добавлений в избранное'),
+        ),
+        migrations.RunPython(fill_favorites_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_newest'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_most_favorited'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cooking_time', 'id'], name='recipe_quickest'),
+        ),
+    ]
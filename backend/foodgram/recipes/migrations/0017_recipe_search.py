@@ -0,0 +1,58 @@
+from django.db import migrations
+
+POSTGRESQL_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+    "UPDATE recipes_recipe SET search_vector = "
+    "setweight(to_tsvector('russian', name), 'A') || "
+    "setweight(to_tsvector('russian', text), 'B')",
+    'CREATE INDEX recipe_search_vector ON recipes_recipe '
+    'USING GIN (search_vector)',
+    'CREATE INDEX recipe_name_trigram ON recipes_recipe '
+    'USING GIN (name gin_trgm_ops)',
+]
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX IF EXISTS recipe_name_trigram',
+    'DROP INDEX IF EXISTS recipe_search_vector',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+]
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE recipes_recipe_search USING fts5("
+    "name, text, prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+    'INSERT INTO recipes_recipe_search (rowid, name, text) '
+    'SELECT id, name, text FROM recipes_recipe',
+]
+SQLITE_BACKWARD = [
+    'DROP TABLE IF EXISTS recipes_recipe_search',
+]
+STATEMENTS = {
+    'postgresql': (POSTGRESQL_FORWARD, POSTGRESQL_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def run_statements(schema_editor, direction):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for statement in statements[direction]:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    run_statements(schema_editor, 0)
+
+
+def drop_search_index(apps, schema_editor):
+    run_statements(schema_editor, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
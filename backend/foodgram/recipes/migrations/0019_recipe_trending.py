@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('favorite', 'Добавление в избранное'), ('shopping_cart', 'Добавление в список покупок')], max_length=16, verbose_name='Событие')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Время события')),
+            ],
+            options={
+                'verbose_name': 'Событие рецепта',
+                'verbose_name_plural': 'События рецептов',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingRecipe',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='recipes.Recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(verbose_name='Логарифм затухающего счёта')),
+                ('last_event', models.BigIntegerField(verbose_name='Последнее учтённое событие')),
+            ],
+            options={
+                'verbose_name': 'Популярный рецепт',
+                'verbose_name_plural': 'Популярные рецепты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='trendingrecipe',
+            index=models.Index(fields=['-score', '-recipe'], name='trending_recipe_score'),
+        ),
+        migrations.AddIndex(
+            model_name='trendingrecipe',
+            index=models.Index(fields=['last_event'], name='trending_recipe_last_event'),
+        ),
+        migrations.AddField(
+            model_name='recipeevent',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='recipes.Recipe', verbose_name='Рецепт'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_recipe_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeTombstone',
+            fields=[
+                ('recipe_id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Id рецепта')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата удаления')),
+            ],
+            options={
+                'verbose_name': 'Удалённый рецепт',
+                'verbose_name_plural': 'Удалённые рецепты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['updated_at', 'id'], name='recipe_changed'),
+        ),
+        migrations.AddIndex(
+            model_name='recipetombstone',
+            index=models.Index(fields=['deleted_at', 'recipe_id'], name='recipe_tombstone_deleted'),
+        ),
+    ]
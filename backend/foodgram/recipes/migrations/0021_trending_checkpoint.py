@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:24
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_checkpoint(apps, schema_editor):
+    TrendingRecipe = apps.get_model('recipes', 'TrendingRecipe')
+    RecipeEvent = apps.get_model('recipes', 'RecipeEvent')
+    TrendingCheckpoint = apps.get_model('recipes', 'TrendingCheckpoint')
+    last = TrendingRecipe.objects.aggregate(last=Max('last_event'))['last']
+    event = RecipeEvent.objects.filter(
+        id__lte=last or 0
+    ).order_by('-id').first()
+    if event is not None:
+        TrendingCheckpoint.objects.create(
+            id=1, created=event.created, event_id=event.id
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0020_recipe_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(verbose_name='Время последнего учтённого события')),
+                ('event_id', models.BigIntegerField(verbose_name='Последнее учтённое событие')),
+            ],
+            options={
+                'verbose_name': 'Отметка пересчёта популярности',
+                'verbose_name_plural': 'Отметки пересчёта популярности',
+            },
+        ),
+        migrations.RunPython(seed_checkpoint, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='trendingrecipe',
+            name='trending_recipe_last_event',
+        ),
+        migrations.RemoveField(
+            model_name='trendingrecipe',
+            name='last_event',
+        ),
+        migrations.AddIndex(
+            model_name='recipeevent',
+            index=models.Index(fields=['created', 'id'], name='recipe_event_created'),
+        ),
+    ]
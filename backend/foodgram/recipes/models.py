@@ -1,10 +1,30 @@
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Lookup
 
 from users.models import User
 
 MIN_LIMIT = 1
 MIN_ERROR = f'Количество не может быть меньше {MIN_LIMIT}'
+TAG_MASK_BITS = 63
+
+
+class BitmaskField(models.BigIntegerField):
+    pass
+
+
+@BitmaskField.register_lookup
+class BitmaskAny(Lookup):
+    lookup_name = 'any'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'({lhs} & {rhs}) <> 0', lhs_params + rhs_params
+
+
+def tags_mask(bits):
+    return sum(1 << bit for bit in bits if bit is not None)
 
 
 class Tag(models.Model):
@@ -27,6 +47,12 @@ class Tag(models.Model):
         max_length=200,
         unique=True
     )
+    bit = models.PositiveSmallIntegerField(
+        'Бит в маске тегов',
+        unique=True,
+        null=True,
+        blank=True
+    )
 
     class Meta:
         ordering = ['name']
@@ -36,6 +62,25 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.bit is not None:
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            used = set(Tag.objects.values_list('bit', flat=True))
+            self.bit = next(
+                (bit for bit in range(TAG_MASK_BITS) if bit not in used),
+                None
+            )
+            adding = self._state.adding
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'bit'}
+            super().save(*args, **kwargs)
+            if self.bit is not None and not adding:
+                Recipe.objects.filter(tags=self).update(
+                    tags_mask=F('tags_mask').bitor(tags_mask([self.bit]))
+                )
+
 
 class Ingredient(models.Model):
     name = models.CharField(
@@ -83,6 +128,18 @@ class Recipe(models.Model):
         'Дата создания',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    tags_mask = BitmaskField(
+        'Маска тегов',
+        default=0
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Количество добавлений в избранное',
+        default=0
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         through='IngredientInRecipe',
@@ -93,6 +150,24 @@ class Recipe(models.Model):
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_newest'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_most_favorited'
+            ),
+            models.Index(
+                fields=['cooking_time', 'id'],
+                name='recipe_quickest'
+            ),
+            models.Index(
+                fields=['updated_at', 'id'],
+                name='recipe_changed'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -164,6 +239,12 @@ class ShoppingCart(models.Model):
                 name='shopping_cart_unique'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe'],
+                name='shopping_cart_user_recipe'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
@@ -190,3 +271,149 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
+
+
+class RecipeCard(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='card',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recipe_cards',
+        verbose_name='Автор'
+    )
+    tags = models.TextField('Слаги тегов', blank=True)
+    payload = models.TextField('Документ рецепта')
+
+    class Meta:
+        verbose_name = 'Карточка рецепта'
+        verbose_name_plural = 'Карточки рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Коэффициент Жаккара')
+
+    class Meta:
+        ordering = ['-score']
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='similar_recipe_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.similar_id}'
+
+
+class RecipeEvent(models.Model):
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    KINDS = [
+        (FAVORITE, 'Добавление в избранное'),
+        (SHOPPING_CART, 'Добавление в список покупок'),
+    ]
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='events',
+        verbose_name='Рецепт'
+    )
+    kind = models.CharField('Событие', max_length=16, choices=KINDS)
+    created = models.DateTimeField('Время события', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Событие рецепта'
+        verbose_name_plural = 'События рецептов'
+        indexes = [
+            models.Index(
+                fields=['created', 'id'],
+                name='recipe_event_created'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.kind}'
+
+
+class TrendingRecipe(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField('Логарифм затухающего счёта')
+
+    class Meta:
+        verbose_name = 'Популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+        indexes = [
+            models.Index(
+                fields=['-score', '-recipe'],
+                name='trending_recipe_score'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.score}'
+
+
+class TrendingCheckpoint(models.Model):
+    created = models.DateTimeField('Время последнего учтённого события')
+    event_id = models.BigIntegerField('Последнее учтённое событие')
+
+    class Meta:
+        verbose_name = 'Отметка пересчёта популярности'
+        verbose_name_plural = 'Отметки пересчёта популярности'
+
+    def __str__(self):
+        return f'{self.created} {self.event_id}'
+
+
+class RecipeTombstone(models.Model):
+    recipe_id = models.BigIntegerField('Id рецепта', primary_key=True)
+    deleted_at = models.DateTimeField('Дата удаления', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Удалённый рецепт'
+        verbose_name_plural = 'Удалённые рецепты'
+        indexes = [
+            models.Index(
+                fields=['deleted_at', 'recipe_id'],
+                name='recipe_tombstone_deleted'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}'
@@ -1,6 +1,8 @@
 import os
 import sys
 
+import pytest
+
 from django.utils.version import get_version
 
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -33,4 +35,17 @@ if FILENAME not in project_dir_content:
 
 pytest_plugins = [
     'tests.fixtures.fixture_user',
+    'tests.fixtures.fixture_recipes',
 ]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    from django.core.cache import cache
+
+    from api.pantry import pantry_index
+    from api.suggest import suggest_index
+
+    cache.clear()
+    for index in (pantry_index, suggest_index):
+        index.index = None
@@ -0,0 +1,59 @@
+import pytest
+
+
+@pytest.fixture
+def tags():
+    from recipes.models import Tag
+
+    return [
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast'),
+        Tag.objects.create(name='Обед', color='#49B64E', slug='lunch'),
+        Tag.objects.create(name='Ужин', color='#8775D2', slug='dinner'),
+    ]
+
+
+@pytest.fixture
+def ingredients():
+    from recipes.models import Ingredient
+
+    return [
+        Ingredient.objects.create(name='Мука', measurement_unit='г'),
+        Ingredient.objects.create(name='Молоко', measurement_unit='мл'),
+        Ingredient.objects.create(name='Яйца', measurement_unit='шт'),
+    ]
+
+
+def create_recipes(author, tags, ingredients, count):
+    from recipes.models import (
+        IngredientInRecipe,
+        Recipe,
+        TagInRecipe,
+        tags_mask
+    )
+
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=f'Рецепт {number}',
+            image=f'/media/recipes/images/{number}.png',
+            text=f'Описание рецепта {number}',
+            cooking_time=number + 1
+        )
+        tag = tags[number % len(tags)]
+        TagInRecipe.objects.create(recipe=recipe, tag=tag)
+        recipe.tags_mask = tags_mask([tag.bit])
+        recipe.save(update_fields=['tags_mask'])
+        for position, ingredient in enumerate(ingredients):
+            IngredientInRecipe.objects.create(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=(number + 1) * (position + 1)
+            )
+        recipes.append(recipe)
+    return recipes
+
+
+@pytest.fixture
+def recipes(admin, tags, ingredients):
+    return create_recipes(admin, tags, ingredients, 12)
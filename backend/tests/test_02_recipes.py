@@ -0,0 +1,1148 @@
+import base64
+import json
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+
+from api.cache import (
+    CHANGE_LOG_LIMIT,
+    DOCUMENT_HITS,
+    DOCUMENT_MISSES,
+    RECIPE_LOG,
+    RESPONSE_HITS,
+    get_change_log_version,
+    get_counters,
+    increment
+)
+from api.filters import RecipeFilter
+from api.paginators import KeysetPaginator
+from api.singleflight import FLIGHT_LOCK, FLIGHT_RESULT, flight_key
+from api.suggest import PrefixIndex, suggest_index
+from api.views import RecipeViewSet, TagsViewSet
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeEvent,
+    ShoppingCart,
+    Tag,
+    TrendingRecipe,
+    tags_mask
+)
+from users.models import Subscribe
+
+INDEX_ONLY = {
+    'sqlite': 'COVERING INDEX',
+    'postgresql': 'Index Only Scan'
+}
+
+
+class Test02RecipeAPI:
+    url = '/api/recipes/'
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == 200, (
+            f'Проверьте, что при GET запросе `{url}` возвращается статус 200'
+        )
+        return len(context.captured_queries)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_recipes_list(self, client, recipes):
+        response = client.get(self.url)
+        assert response.status_code == 200, (
+            f'Проверьте, что при GET запросе `{self.url}` возвращается статус 200'
+        )
+        data = response.json()
+        assert data['count'] == len(recipes), (
+            f'Проверьте, что при GET запросе `{self.url}` '
+            'значение параметра `count` правильное'
+        )
+        recipe = data['results'][0]
+        assert recipe['id'] == recipes[-1].id, (
+            f'Проверьте, что `{self.url}` отдает рецепты начиная с новых'
+        )
+        assert (
+            len(recipe['ingredients']) == 3
+            and len(recipe['tags']) == 1
+            and recipe['author']['is_subscribed'] is False
+            and recipe['is_favorited'] is False
+            and recipe['is_in_shopping_cart'] is False
+        ), (
+            f'Проверьте, что `{self.url}` отдает рецепты со всеми полями'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_recipes_user_flags(self, user_client, user, recipes):
+        Favorite.objects.create(user=user, recipe=recipes[-1])
+        ShoppingCart.objects.create(user=user, recipe=recipes[-2])
+        Subscribe.objects.create(user=user, subscribing=recipes[0].author)
+        results = user_client.get(self.url).json()['results']
+        assert (
+            results[0]['is_favorited'] is True
+            and results[0]['is_in_shopping_cart'] is False
+            and results[1]['is_favorited'] is False
+            and results[1]['is_in_shopping_cart'] is True
+        ), (
+            'Проверьте, что флаги `is_favorited` и `is_in_shopping_cart` '
+            'учитывают текущего пользователя'
+        )
+        assert all(item['author']['is_subscribed'] for item in results), (
+            'Проверьте, что флаг `author.is_subscribed` '
+            'учитывает подписки текущего пользователя'
+        )
+        recipe = user_client.get(f'{self.url}{recipes[-1].id}/').json()
+        assert recipe['is_favorited'] is True, (
+            f'Проверьте, что `{self.url}{{id}}/` отдает флаг `is_favorited`'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_recipes_list_queries(self, user_client, recipes):
+        small = self.count_queries(user_client, f'{self.url}?limit=2')
+        large = self.count_queries(user_client, f'{self.url}?limit=12')
+        assert small == large, (
+            f'Проверьте, что количество запросов к БД при GET `{self.url}` '
+            'не зависит от количества рецептов на странице'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_04_recipes_cursor_pagination(self, client, recipes):
+        url = f'{self.url}?pagination=cursor&limit=5'
+        data = client.get(url).json()
+        assert 'count' not in data and data['previous'] is None, (
+            'Проверьте, что в режиме `pagination=cursor` '
+            'не считается общее количество рецептов'
+        )
+        ids = [item['id'] for item in data['results']]
+        pages = [data]
+        while data['next']:
+            data = client.get(data['next']).json()
+            pages.append(data)
+            ids += [item['id'] for item in data['results']]
+        expected = [recipe.id for recipe in reversed(recipes)]
+        assert ids == expected, (
+            'Проверьте, что курсорная пагинация отдает все рецепты '
+            'в порядке `-pub_date` без пропусков и повторов'
+        )
+        previous = client.get(pages[-1]['previous']).json()
+        assert previous['results'] == pages[-2]['results'], (
+            'Проверьте, что ссылка `previous` ведет на предыдущую страницу'
+        )
+        for cursor in ['bad', [False, ['garbage', 1]], [False, 5],
+                       [False, [{}, 1]], [False, [None, 1]], 5]:
+            if not isinstance(cursor, str):
+                cursor = base64.urlsafe_b64encode(
+                    json.dumps(cursor).encode()
+                ).decode()
+            response = client.get(
+                self.url, {'pagination': 'cursor', 'cursor': cursor}
+            )
+            assert response.status_code == 404, (
+                'Проверьте, что при неверном курсоре возвращается статус 404'
+            )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_05_recipes_cursor_pagination_filter(self, client, recipes):
+        url = f'{self.url}?pagination=cursor&limit=2&tags=breakfast'
+        data = client.get(url).json()
+        ids = [item['id'] for item in data['results']]
+        while data['next']:
+            data = client.get(data['next']).json()
+            ids += [item['id'] for item in data['results']]
+        expected = [
+            recipe.id for recipe in reversed(recipes)
+            if recipe.tags.filter(slug='breakfast').exists()
+        ]
+        assert ids == expected, (
+            'Проверьте, что курсорная пагинация работает вместе с фильтрами'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_06_recipes_document_cache(self, client, user_client, user,
+                                       recipes):
+        client.get(self.url)
+        counters = get_counters(DOCUMENT_HITS, DOCUMENT_MISSES)
+        assert counters == {DOCUMENT_HITS: 0, DOCUMENT_MISSES: 10}, (
+            'Проверьте, что документы рецептов попадают в кэш'
+        )
+        Favorite.objects.create(user=user, recipe=recipes[-1])
+        results = user_client.get(self.url).json()['results']
+        assert get_counters(DOCUMENT_HITS)[DOCUMENT_HITS] == 10, (
+            'Проверьте, что документы рецептов общие для всех пользователей'
+        )
+        assert results[0]['is_favorited'] is True, (
+            'Проверьте, что флаги пользователя добавляются к документам из кэша'
+        )
+        author = recipes[-1].author
+        author.first_name = 'Переименован'
+        author.save()
+        results = client.get(self.url).json()['results']
+        assert results[0]['author']['first_name'] == 'Переименован', (
+            'Проверьте, что изменение профиля автора сбрасывает кэш документов'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_07_recipes_conditional_get(self, client, user_client, user,
+                                        recipes):
+        url = f'{self.url}{recipes[0].id}/'
+        response = client.get(url)
+        etag = response['ETag']
+        assert response.has_header('Last-Modified'), (
+            f'Проверьте, что `{url}` отдает заголовки `ETag` и `Last-Modified`'
+        )
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304, (
+            'Проверьте, что при совпадении `If-None-Match` '
+            'возвращается статус 304'
+        )
+        response = client.get(
+            url, HTTP_IF_MODIFIED_SINCE=client.get(url)['Last-Modified']
+        )
+        assert response.status_code == 304, (
+            'Проверьте, что при актуальном `If-Modified-Since` '
+            'возвращается статус 304'
+        )
+        recipes[0].save()
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200, (
+            'Проверьте, что после изменения рецепта `ETag` меняется'
+        )
+        etag = user_client.get(self.url)['ETag']
+        response = user_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304, (
+            f'Проверьте, что `{self.url}` поддерживает `If-None-Match`'
+        )
+        Favorite.objects.create(user=user, recipe=recipes[-1])
+        response = user_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200, (
+            'Проверьте, что `ETag` списка учитывает флаги пользователя'
+        )
+        response = user_client.get(
+            f'{self.url}?limit=5', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        assert response.status_code == 200, (
+            'Проверьте, что `ETag` списка учитывает параметры запроса'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_08_tags_ingredients_conditional_get(self, client, tags,
+                                                 ingredients):
+        for url in ['/api/tags/', '/api/ingredients/']:
+            etag = client.get(url)['ETag']
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == 304, (
+                f'Проверьте, что `{url}` поддерживает `If-None-Match`'
+            )
+        etag = client.get('/api/tags/')['ETag']
+        tags[0].name = 'Полдник'
+        tags[0].save()
+        response = client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200, (
+            'Проверьте, что изменение тега меняет `ETag` списка тегов'
+        )
+        assert 'Полдник' in [tag['name'] for tag in response.json()], (
+            'Проверьте, что после изменения тега отдается новый список'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_09_recipes_sparse_fields(self, user_client, user, recipes):
+        Favorite.objects.create(user=user, recipe=recipes[-1])
+        url = f'{self.url}?fields=id,name,image,is_favorited'
+        with CaptureQueriesContext(connection) as context:
+            results = user_client.get(url).json()['results']
+        assert list(results[0]) == ['id', 'name', 'image', 'is_favorited'], (
+            'Проверьте, что параметр `fields` оставляет только указанные поля'
+        )
+        assert results[0]['is_favorited'] is True, (
+            'Проверьте, что параметр `fields` не ломает флаги пользователя'
+        )
+        assert not any(
+            'recipes_ingredientinrecipe' in query['sql']
+            or '"text"' in query['sql']
+            for query in context.captured_queries
+        ), (
+            'Проверьте, что при `fields` не загружаются лишние столбцы '
+            'и связанные объекты'
+        )
+        results = user_client.get(
+            f'{self.url}?omit=text,ingredients,author'
+        ).json()['results']
+        assert set(results[0]) == {
+            'id', 'tags', 'name', 'image', 'cooking_time',
+            'is_favorited', 'is_in_shopping_cart'
+        }, (
+            'Проверьте, что параметр `omit` убирает указанные поля'
+        )
+        assert user_client.get(f'{self.url}?fields=').json()['results'] == (
+            user_client.get(self.url).json()['results']
+        ), 'Проверьте, что пустой `fields` возвращает все поля'
+        response = user_client.get(f'{self.url}?fields=id,unknown')
+        assert response.status_code == 400, (
+            'Проверьте, что при неизвестном поле в `fields` '
+            'возвращается статус 400'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_10_subscriptions_sparse_fields(self, user_client, user, recipes):
+        Subscribe.objects.create(user=user, subscribing=recipes[0].author)
+        url = '/api/users/subscriptions/?fields=username,recipes_count'
+        results = user_client.get(url).json()['results']
+        assert results == [{
+            'username': recipes[0].author.username,
+            'recipes_count': len(recipes)
+        }], (
+            'Проверьте, что `/api/users/subscriptions/` '
+            'поддерживает параметр `fields`'
+        )
+        response = user_client.get('/api/users/subscriptions/?omit=bad')
+        assert response.status_code == 400, (
+            'Проверьте, что при неизвестном поле в `omit` '
+            'возвращается статус 400'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_11_recipes_tags_mask_filter(self, client, recipes, tags):
+        url = f'{self.url}?tags=breakfast&tags=dinner&limit=50'
+        with CaptureQueriesContext(connection) as context:
+            results = client.get(url).json()['results']
+        expected = [
+            recipe.id for recipe in reversed(recipes)
+            if recipe.tags.filter(slug__in=['breakfast', 'dinner']).exists()
+        ]
+        assert [item['id'] for item in results] == expected, (
+            'Проверьте, что фильтр `tags` возвращает рецепты '
+            'с любым из указанных тегов без повторов'
+        )
+        filtered = [
+            query['sql'] for query in context.captured_queries
+            if '"tags_mask" &' in query['sql']
+        ]
+        assert filtered and all('JOIN' not in sql for sql in filtered), (
+            'Проверьте, что фильтр `tags` проверяет маску тегов '
+            'без соединения таблиц'
+        )
+        tags[0].delete()
+        assert not Recipe.objects.filter(
+            tags_mask__any=tags_mask([tags[0].bit])
+        ).exists(), (
+            'Проверьте, что при удалении тега его бит снимается с рецептов'
+        )
+        overflow = tags[1]
+        Recipe.objects.update(
+            tags_mask=F('tags_mask').bitand(~tags_mask([overflow.bit]))
+        )
+        Tag.objects.filter(id=overflow.id).update(bit=None)
+        overflow.refresh_from_db()
+        overflow.save()
+        results = client.get(
+            self.url, {'tags': overflow.slug, 'limit': 50}
+        ).json()['results']
+        assert [item['id'] for item in results] == [
+            recipe.id for recipe in reversed(recipes)
+            if recipe.tags.filter(id=overflow.id).exists()
+        ], (
+            'Проверьте, что при назначении освободившегося бита '
+            'существующему тегу маски его рецептов заполняются'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_12_recipes_tags_filter_queries(self, client, recipes, tags):
+        url = f'{self.url}?tags=breakfast&tags=lunch'
+        self.count_queries(client, url)
+        self.count_queries(client, self.url)
+        with CaptureQueriesContext(connection) as context:
+            client.get(url)
+        assert not any(
+            'DISTINCT' in query['sql'] or '"recipes_tag"' in query['sql']
+            for query in context.captured_queries
+        ), (
+            'Проверьте, что допустимые слаги тегов берутся из кэша, '
+            'а не из запроса к базе'
+        )
+        assert (
+            self.count_queries(client, url)
+            == self.count_queries(client, self.url)
+        ), (
+            'Проверьте, что фильтр `tags` не добавляет запросов к базе'
+        )
+        tags[0].slug = 'morning'
+        tags[0].save()
+        response = client.get(f'{self.url}?tags=morning')
+        assert response.status_code == 200, (
+            'Проверьте, что реестр тегов обновляется при изменении тега'
+        )
+        assert client.get(url).status_code == 400, (
+            'Проверьте, что при неизвестном слаге тега возвращается статус 400'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_13_recipes_user_filters_exists(self, user_client, user,
+                                            recipes):
+        url = f'{self.url}?is_favorited=1&is_in_shopping_cart=0&limit=50'
+        Favorite.objects.bulk_create([
+            Favorite(user=user, recipe=recipe) for recipe in recipes[:6]
+        ])
+        ShoppingCart.objects.bulk_create([
+            ShoppingCart(user=user, recipe=recipe) for recipe in recipes[:3]
+        ])
+        data = user_client.get(url).json()
+        assert [item['id'] for item in data['results']] == [
+            recipe.id for recipe in reversed(recipes[3:6])
+        ] and data['count'] == 3, (
+            'Проверьте, что `is_favorited=1` оставляет только избранные '
+            'рецепты, а `is_in_shopping_cart=0` исключает рецепты '
+            'из списка покупок'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_14_recipes_user_filters_plan(self, user, admin):
+        Recipe.objects.bulk_create([
+            Recipe(
+                author=admin, name=f'Рецепт {number}', image='image.png',
+                text='Описание', cooking_time=1
+            )
+            for number in range(10000)
+        ])
+        for owner in [user, admin]:
+            Favorite.objects.bulk_create([
+                Favorite(user=owner, recipe_id=id)
+                for id in Recipe.objects.values_list('id', flat=True)
+            ])
+            ShoppingCart.objects.bulk_create([
+                ShoppingCart(user=owner, recipe_id=id)
+                for id in Recipe.objects.values_list('id', flat=True)[::2]
+            ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        for params in [
+            {'is_favorited': '1'},
+            {'is_favorited': '0'},
+            {'is_in_shopping_cart': '1'},
+            {'is_in_shopping_cart': '0'},
+        ]:
+            queryset = RecipeFilter(
+                params,
+                queryset=Recipe.objects.all(),
+                request=SimpleNamespace(user=user)
+            ).qs
+            sql = str(queryset.query)
+            assert 'IN (SELECT' in sql and 'EXISTS' not in sql, (
+                'Проверьте, что фильтры по пользователю компилируются '
+                f'в подзапрос IN / NOT IN без аннотаций: {sql}'
+            )
+            plan = queryset.explain()
+            assert INDEX_ONLY[connection.vendor] in plan, (
+                'Проверьте, что фильтры `is_favorited` и '
+                '`is_in_shopping_cart` используют только индекс '
+                f'`(user_id, recipe_id)`: {params}\n{plan}'
+            )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_15_recipes_ordering(self, client, user_client, recipes):
+        for recipe in recipes[2:5]:
+            response = user_client.post(f'{self.url}{recipe.id}/favorite/')
+            assert response.status_code == 201
+        user_client.delete(f'{self.url}{recipes[2].id}/favorite/')
+        assert list(
+            Recipe.objects.order_by('id').values_list(
+                'favorites_count', flat=True
+            )
+        ) == [0, 0, 0, 1, 1] + [0] * 7, (
+            'Проверьте, что счётчик избранного обновляется при добавлении '
+            'и удалении рецепта из избранного'
+        )
+        expected = {
+            '-favorites_count': [
+                recipes[4].id, recipes[3].id
+            ] + [recipe.id for recipe in reversed(recipes)
+                 if recipe not in recipes[3:5]],
+            'cooking_time': [recipe.id for recipe in recipes],
+            '-pub_date': [recipe.id for recipe in reversed(recipes)]
+        }
+        for ordering, ids in expected.items():
+            url = f'{self.url}?ordering={ordering}&limit=5'
+            data = client.get(url).json()
+            assert [item['id'] for item in data['results']] == ids[:5], (
+                f'Проверьте сортировку `{ordering}`'
+            )
+            data = client.get(f'{url}&pagination=cursor').json()
+            cursor_ids = [item['id'] for item in data['results']]
+            while data['next']:
+                data = client.get(data['next']).json()
+                cursor_ids += [item['id'] for item in data['results']]
+            assert cursor_ids == ids, (
+                f'Проверьте, что сортировка `{ordering}` работает '
+                'с курсорной пагинацией'
+            )
+        response = client.get(f'{self.url}?ordering=name')
+        assert response.status_code == 400, (
+            'Проверьте, что при неизвестной сортировке возвращается статус 400'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_16_recipes_facets(self, client, recipes, tags):
+        url = '/api/recipes/facets/?cooking_time_min=2&cooking_time_max=12'
+        with CaptureQueriesContext(connection) as context:
+            data = client.get(url).json()
+        filtered = [
+            recipe for recipe in recipes if 2 <= recipe.cooking_time <= 12
+        ]
+        assert data['count'] == len(filtered) and data['tags'] == [
+            {
+                'slug': tag.slug,
+                'count': sum(
+                    recipe.tags.filter(id=tag.id).exists()
+                    for recipe in filtered
+                )
+            }
+            for tag in sorted(tags, key=lambda tag: tag.name)
+        ], (
+            'Проверьте, что `/api/recipes/facets/` считает рецепты по тегам '
+            'с учётом фильтров'
+        )
+        assert [bucket['count'] for bucket in data['cooking_time']] == [
+            len(filtered), 0, 0, 0
+        ], (
+            'Проверьте гистограмму времени приготовления'
+        )
+        assert len([
+            query for query in context.captured_queries
+            if 'GROUP BY' in query['sql']
+        ]) == 1, (
+            'Проверьте, что фасеты считаются одним сгруппированным запросом'
+        )
+        with CaptureQueriesContext(connection) as context:
+            client.get(url)
+        assert not context.captured_queries, (
+            'Проверьте, что фасеты кэшируются для каждого набора фильтров'
+        )
+        recipes[1].cooking_time = 100
+        recipes[1].save()
+        data = client.get(url).json()
+        assert data['count'] == len(filtered) - 1, (
+            'Проверьте, что кэш фасетов сбрасывается при изменении рецептов'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_17_recipes_search(self, client, recipes):
+        recipes[0].name = 'Борщ украинский'
+        recipes[0].save()
+        recipes[1].text = 'Подаётся к борщу'
+        recipes[1].save()
+        recipes[2].name = 'Сырники'
+        recipes[2].text = 'Не путать с борщом'
+        recipes[2].save()
+        data = client.get(f'{self.url}?search=борщ').json()
+        ids = [item['id'] for item in data['results']]
+        assert ids[0] == recipes[0].id and set(ids) == {
+            recipe.id for recipe in recipes[:3]
+        }, (
+            'Проверьте, что `search` находит рецепты по началу слова '
+            'в названии и описании и ставит совпадения в названии выше'
+        )
+        data = client.get(
+            f'{self.url}?search=борщ&tags={recipes[1].tags.get().slug}'
+        ).json()
+        assert [item['id'] for item in data['results']] == [recipes[1].id], (
+            'Проверьте, что `search` работает вместе с другими фильтрами'
+        )
+        data = client.get(
+            self.url, {'search': 'борщ', 'pagination': 'cursor', 'limit': 1}
+        ).json()
+        cursor_ids = [item['id'] for item in data['results']]
+        while data['next']:
+            data = client.get(data['next']).json()
+            cursor_ids += [item['id'] for item in data['results']]
+        assert cursor_ids == ids, (
+            'Проверьте, что поиск работает с курсорной пагинацией'
+        )
+        recipes[0].delete()
+        call_command('rebuild_search_index')
+        data = client.get(f'{self.url}?search=украинский').json()
+        assert data['count'] == 0, (
+            'Проверьте, что удалённые рецепты пропадают из поиска'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_18_recipes_suggest(self, client, user_client, recipes,
+                                monkeypatch):
+        url = '/api/recipes/suggest/'
+        expected = [
+            {'id': recipe.id, 'name': recipe.name}
+            for recipe in sorted(recipes, key=lambda recipe: recipe.name)[:3]
+        ]
+        assert client.get(url, {'q': 'Рец', 'limit': 3}).json() == expected, (
+            'Проверьте, что пока индекс подсказок строится в фоне, '
+            'подсказки читаются из базы'
+        )
+        suggest_index.rebuilder.join()
+        assert client.get(url, {'q': 'рец', 'limit': 3}).json() == expected, (
+            'Проверьте, что `/api/recipes/suggest/` возвращает рецепты, '
+            'название которых начинается с запроса'
+        )
+        index = suggest_index.index
+        recipes[0].name = 'Ёжики в томате'
+        recipes[0].save()
+        recipes[1].name = 'Ежевичный пирог'
+        recipes[1].save()
+        recipe_log = get_change_log_version(RECIPE_LOG)
+        user_client.post(f'{self.url}{recipes[1].id}/favorite/')
+        assert get_change_log_version(RECIPE_LOG) == recipe_log, (
+            'Проверьте, что избранное не пишется в журнал изменений рецептов'
+        )
+        assert client.get(url, {'q': 'ЕЖ'}).json() == [
+            {'id': recipes[1].id, 'name': 'Ежевичный пирог'},
+            {'id': recipes[0].id, 'name': 'Ёжики в томате'},
+        ], (
+            'Проверьте, что подсказки не различают регистр и `ё`/`е` '
+            'и упорядочены по популярности'
+        )
+        recipes[1].delete()
+        assert client.get(url, {'q': 'ёж'}).json() == [
+            {'id': recipes[0].id, 'name': 'Ёжики в томате'}
+        ], (
+            'Проверьте, что удалённые рецепты пропадают из подсказок'
+        )
+        assert suggest_index.index is index, (
+            'Проверьте, что индекс подсказок обновляется инкрементально'
+        )
+        Recipe.objects.filter(id=recipes[0].id).update(name='Ёлка')
+        suggest_index.versions[RECIPE_LOG] -= CHANGE_LOG_LIMIT + 1
+        assert client.get(url, {'q': 'ёж'}).json() == [
+            {'id': recipes[0].id, 'name': 'Ёжики в томате'}
+        ], (
+            'Проверьте, что при разрыве журнала отдаётся прежний индекс, '
+            'пока новый строится в фоне'
+        )
+        suggest_index.rebuilder.join()
+        assert client.get(url, {'q': 'ёл'}).json() == [
+            {'id': recipes[0].id, 'name': 'Ёлка'}
+        ], 'Проверьте, что фоновая перестройка подменяет индекс'
+        locked = []
+        original = PrefixIndex.suggest
+
+        def suggest(index, *args):
+            locked.append(suggest_index.lock.locked())
+            return original(index, *args)
+
+        monkeypatch.setattr(PrefixIndex, 'suggest', suggest)
+        client.get(url, {'q': 'ёл'})
+        assert locked == [True], (
+            'Проверьте, что подсказки читают индекс под блокировкой, '
+            'пока другие запросы не могут его изменять'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    @override_settings(TRENDING_EVENT_DELAY=0, TRENDING_HALF_LIFE=3600)
+    def test_19_recipes_trending(self, client, user_client, admin_client,
+                                 recipes):
+        url = f'{self.url}trending/'
+        user_client.post(f'{self.url}{recipes[0].id}/favorite/')
+        user_client.post(f'{self.url}{recipes[1].id}/shopping_cart/')
+        user_client.post(f'{self.url}{recipes[2].id}/favorite/')
+        RecipeEvent.objects.filter(recipe=recipes[2]).update(
+            created=RecipeEvent.objects.get(recipe=recipes[2]).created
+            - timedelta(hours=2)
+        )
+        call_command('update_trending')
+        data = client.get(url, {'limit': 2}).json()
+        ids = [item['id'] for item in data['results']]
+        ids += [item['id'] for item in client.get(data['next']).json()[
+            'results'
+        ]]
+        assert ids == [recipes[0].id, recipes[1].id, recipes[2].id], (
+            'Проверьте, что `/api/recipes/trending/` упорядочивает рецепты '
+            'по затухающему со временем счёту с курсорной пагинацией'
+        )
+        untouched = TrendingRecipe.objects.get(recipe=recipes[0])
+        admin_client.post(f'{self.url}{recipes[2].id}/favorite/')
+        admin_client.post(f'{self.url}{recipes[2].id}/shopping_cart/')
+        output = StringIO()
+        call_command('update_trending', stdout=output)
+        assert 'Учтено событий: 2, обновлено рецептов: 1' in (
+            output.getvalue()
+        ), (
+            'Проверьте, что пересчёт затрагивает только рецепты '
+            'с новыми событиями'
+        )
+        assert TrendingRecipe.objects.get(recipe=recipes[0]).score == (
+            untouched.score
+        )
+        assert [
+            item['id'] for item in client.get(url).json()['results']
+        ] == [recipes[2].id, recipes[0].id, recipes[1].id], (
+            'Проверьте, что новые события поднимают рецепт в рейтинге'
+        )
+        scores = dict(TrendingRecipe.objects.values_list('recipe', 'score'))
+        call_command('update_trending', '--rebuild')
+        assert dict(
+            TrendingRecipe.objects.values_list('recipe', 'score')
+        ) == pytest.approx(scores), (
+            'Проверьте, что инкрементальный пересчёт совпадает с полным'
+        )
+        late = RecipeEvent.objects.get(recipe=recipes[1]).id
+        RecipeEvent.objects.filter(id=late).delete()
+        RecipeEvent.objects.create(
+            id=late, recipe=recipes[1], kind=RecipeEvent.FAVORITE
+        )
+        recipes[2].delete()
+        output = StringIO()
+        call_command('update_trending', stdout=output)
+        assert 'Учтено событий: 1, обновлено рецептов: 1' in (
+            output.getvalue()
+        ), (
+            'Проверьте, что событие, зафиксированное позже событий с '
+            'большим id, учитывается ровно один раз, а удаление рецепта '
+            'не сдвигает отметку пересчёта назад'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    @override_settings(RECIPE_CHANGES_DELAY=0)
+    def test_20_recipes_changes(self, client, admin, tags, recipes):
+        url = f'{self.url}changes/'
+        ids = []
+        params = {'limit': 5}
+        while True:
+            data = client.get(url, params).json()
+            assert len(data['changes']) <= 5, (
+                'Проверьте, что изменения отдаются ограниченными пачками'
+            )
+            ids += [item['id'] for item in data['changes']]
+            params['since'] = data['next']
+            if not data['has_more']:
+                break
+        assert sorted(ids) == sorted(recipe.id for recipe in recipes), (
+            'Проверьте, что `/api/recipes/changes/` без токена отдаёт '
+            'все рецепты'
+        )
+        recipes[3].name = 'Изменённый рецепт'
+        recipes[3].save()
+        deleted_id = recipes[4].id
+        recipes[4].delete()
+        data = client.get(url, params).json()
+        assert (
+            [item['id'] for item in data['changes']], data['deleted']
+        ) == ([recipes[3].id], [deleted_id]), (
+            'Проверьте, что `/api/recipes/changes/` возвращает изменённые '
+            'рецепты и id удалённых после токена'
+        )
+        assert data['changes'][0]['name'] == 'Изменённый рецепт'
+        data = client.get(url, {'since': data['next']}).json()
+        assert not data['changes'] and not data['deleted'], (
+            'Проверьте, что новый токен не возвращает уже отданные изменения'
+        )
+        tags[0].name = 'Поздний завтрак'
+        tags[0].save()
+        data = client.get(url, {'since': data['next']}).json()
+        assert sorted(item['id'] for item in data['changes']) == [
+            recipe.id for recipe in recipes[::3]
+        ], (
+            'Проверьте, что переименование тега попадает в изменения '
+            'его рецептов'
+        )
+        admin.first_name = 'Новое имя'
+        admin.save()
+        data = client.get(url, {'since': data['next']}).json()
+        assert len(data['changes']) == len(recipes) - 1, (
+            'Проверьте, что изменение автора попадает в изменения '
+            'его рецептов'
+        )
+        admin.set_password('новый-пароль')
+        admin.is_active = False
+        admin.save()
+        data = client.get(url, {'since': data['next']}).json()
+        assert not data['changes'], (
+            'Проверьте, что сохранение автора без изменения его данных '
+            'в документах рецептов не попадает в изменения'
+        )
+        naive = base64.urlsafe_b64encode(
+            json.dumps(['2100-01-01T00:00:00', 0]).encode()
+        ).decode()
+        for token in ['garbage', naive]:
+            assert client.get(url, {'since': token}).status_code == 400, (
+                'Проверьте, что неверный токен возвращает статус 400'
+            )
+        expired = base64.urlsafe_b64encode(
+            json.dumps(['2000-01-01T00:00:00+00:00', 0]).encode()
+        ).decode()
+        assert client.get(url, {'since': expired}).status_code == 410, (
+            'Проверьте, что токен старше срока хранения удалений '
+            'возвращает статус 410'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    @override_settings(RECIPE_CHANGES_DELAY=0)
+    def test_21_subscription_updates(self, user_client, admin, user,
+                                     django_user_model, recipes,
+                                     monkeypatch):
+        url = '/api/users/subscriptions/updates/'
+        other = django_user_model.objects.create_user(
+            username='other', email='other@yamdb.fake', password='1234567'
+        )
+        Subscribe.objects.create(user=user, subscribing=admin)
+        data = user_client.get(url, {'timeout': 0, 'limit': 100}).json()
+        assert [item['id'] for item in data['results']] == sorted(
+            recipe.id for recipe in recipes
+        ), (
+            'Проверьте, что `/api/users/subscriptions/updates/` сразу '
+            'возвращает рецепты подписок новее `since`'
+        )
+        since = data['since']
+
+        def publish(author, name):
+            time.sleep(0.2)
+            Recipe.objects.create(
+                author=author, name=name, image='new.png', text='Текст',
+                cooking_time=1
+            )
+            connection.close()
+
+        thread = threading.Thread(target=publish, args=(other, 'Чужой'))
+        thread.start()
+        started = time.monotonic()
+        data = user_client.get(url, {'since': since, 'timeout': 1}).json()
+        thread.join()
+        assert data['results'] == [], (
+            'Проверьте, что рецепты неподписанных авторов не возвращаются'
+        )
+        assert time.monotonic() - started >= 1, (
+            'Проверьте, что запрос ждёт до истечения таймаута'
+        )
+        thread = threading.Thread(target=publish, args=(admin, 'Новый'))
+        thread.start()
+        started = time.monotonic()
+        data = user_client.get(url, {'since': since, 'timeout': 10}).json()
+        thread.join()
+        assert [item['name'] for item in data['results']] == ['Новый'], (
+            'Проверьте, что ожидание прерывается публикацией рецепта '
+            'автора из подписок'
+        )
+        assert time.monotonic() - started < 5, (
+            'Проверьте, что ожидание будится уведомлением, а не таймаутом'
+        )
+        recipe = recipes[0]
+        recipe.text = 'Изменённый текст'
+        recipe.save()
+        admin.first_name = 'Новое имя'
+        admin.save()
+        assert user_client.get(
+            url, {'since': data['since'], 'timeout': 0}
+        ).json()['results'] == [], (
+            'Проверьте, что изменения опубликованных рецептов и их авторов '
+            'не попадают в ленту новых рецептов'
+        )
+        with override_settings(RECIPE_CHANGES_DELAY=60):
+            data = user_client.get(url, {'timeout': 0}).json()
+            assert data['results'] == [], (
+                'Проверьте, что обновления отдаются только после окна '
+                'фиксации транзакций'
+            )
+            Recipe.objects.update(
+                pub_date=timezone.now() - timedelta(minutes=2)
+            )
+            data = user_client.get(url, {'timeout': 0, 'limit': 100}).json()
+            assert len(data['results']) == len(recipes) + 1
+        waiters = threading.BoundedSemaphore(1)
+        waiters.acquire()
+        monkeypatch.setattr('api.notifications.waiters', waiters)
+        response = user_client.get(url, {'since': data['since']})
+        assert response.status_code == 429, (
+            'Проверьте, что число ожидающих запросов ограничено'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    @override_settings(RECIPES_STREAM_CHUNK=5)
+    def test_22_recipes_streaming(self, user_client, recipes):
+        expected = user_client.get(self.url, {'limit': 12}).json()['results']
+        response = user_client.get(
+            self.url, {'limit': settings.RECIPES_MAX_PAGE_SIZE + 1}
+        )
+        assert not response.streaming, (
+            'Проверьте, что страницы больше максимального размера '
+            'ограничиваются, а не отдаются потоком'
+        )
+        assert response.json()['results'] == expected
+        response = user_client.get(self.url, {'stream': 'true', 'limit': 7})
+        assert json.loads(b''.join(response.streaming_content)) == {
+            'results': expected[:7]
+        }, (
+            'Проверьте, что `stream=true` отдаёт первые `limit` рецептов'
+        )
+        with override_settings(RECIPES_MAX_STREAM_SIZE=10):
+            response = user_client.get(
+                self.url, {'stream': 'true', 'limit': 1000}
+            )
+            assert json.loads(b''.join(response.streaming_content)) == {
+                'results': expected[:10]
+            }, (
+                'Проверьте, что размер потокового ответа ограничен '
+                '`RECIPES_MAX_STREAM_SIZE`'
+            )
+        assert KeysetPaginator().get_page_size(SimpleNamespace(
+            query_params={'limit': str(settings.RECIPES_MAX_PAGE_SIZE + 1)}
+        )) == settings.RECIPES_MAX_PAGE_SIZE, (
+            'Проверьте, что курсорная пагинация ограничивает размер страницы'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_23_anonymous_response_cache(self, client, user_client, admin,
+                                         user_superuser_client, tags,
+                                         recipes, tmp_path):
+        def get(url, params=None):
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url, params)
+            assert response.status_code == 200
+            return response.get('X-Cache'), len(context.captured_queries)
+
+        urls = [
+            (self.url, None),
+            (self.url, {'tags': 'breakfast'}),
+            (self.url, {'ordering': '-favorites_count'}),
+            (f'{self.url}{recipes[0].id}/', None),
+            ('/api/tags/', None),
+            ('/api/ingredients/', None),
+        ]
+        for url, params in urls:
+            assert get(url, params)[0] == 'MISS'
+            assert get(url, params) == ('HIT', 0), (
+                f'Проверьте, что анонимный GET `{url}` отдаётся из кэша '
+                'без запросов к БД'
+            )
+        assert 'X-Cache' not in user_client.get(self.url), (
+            'Проверьте, что ответы авторизованным пользователям не кэшируются'
+        )
+        recipes[1].cooking_time = 100
+        recipes[1].save()
+        assert get(self.url, {'tags': 'breakfast'})[0] == 'HIT', (
+            'Проверьте, что изменение рецепта с другим тегом не сбрасывает '
+            'кэш списка по тегу'
+        )
+        assert get(self.url)[0] == 'MISS'
+        recipes[0].cooking_time = 100
+        recipes[0].save()
+        assert get(self.url, {'tags': 'breakfast'})[0] == 'MISS', (
+            'Проверьте, что изменение рецепта сбрасывает кэш его тегов'
+        )
+        user_client.post(f'{self.url}{recipes[2].id}/favorite/')
+        assert get(self.url, {'ordering': '-favorites_count'})[0] == 'MISS', (
+            'Проверьте, что добавление в избранное сбрасывает кэш '
+            'сортировки по популярности'
+        )
+        admin.first_name = 'Новое имя'
+        admin.save()
+        assert get(f'{self.url}{recipes[0].id}/')[0] == 'MISS', (
+            'Проверьте, что изменение автора сбрасывает кэш его рецептов'
+        )
+        assert get('/api/ingredients/')[0] == 'HIT'
+        tags[0].name = 'Поздний завтрак'
+        tags[0].save()
+        assert get('/api/tags/')[0] == 'MISS'
+        stats = user_superuser_client.get('/api/cache/stats/').json()
+        assert stats['anonymous_responses']['hits'] == 8 and stats[
+            'anonymous_responses'
+        ]['misses'] == 11, (
+            'Проверьте, что `/api/cache/stats/` показывает статистику '
+            'кэша ответов текущего процесса'
+        )
+        assert user_client.get('/api/cache/stats/').status_code == 403
+        with pytest.raises(CommandError):
+            call_command('cache_stats')
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path)
+        }}):
+            increment(RESPONSE_HITS)
+            output = StringIO()
+            call_command('cache_stats', stdout=output)
+        assert 'anonymous responses: hits=1 misses=0' in output.getvalue(), (
+            'Проверьте, что `cache_stats` показывает долю попаданий '
+            'в общий кэш ответов'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    @override_settings(SINGLE_FLIGHT_WAIT=0.5)
+    def test_24_recipes_single_flight(self, user_client, token_user,
+                                      recipes, monkeypatch):
+        calls = []
+        original = RecipeViewSet.list
+
+        def slow_list(view, request, *args, **kwargs):
+            calls.append(request)
+            time.sleep(0.3)
+            return original(view, request, *args, **kwargs)
+
+        monkeypatch.setattr(RecipeViewSet, 'list', slow_list)
+        responses = []
+
+        def get():
+            responses.append(user_client.get(self.url).content)
+            connection.close()
+
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1, (
+            'Проверьте, что одинаковые одновременные запросы вычисляются '
+            'один раз'
+        )
+        assert len(set(responses)) == 1 and len(responses) == 4, (
+            'Проверьте, что ожидающие запросы получают ответ первого'
+        )
+        key = FLIGHT_LOCK.format(key=flight_key(RequestFactory().get(
+            self.url,
+            HTTP_AUTHORIZATION=f'Token {token_user["access"]}'
+        )))
+        cache.set(key, 'remote')
+        cache.set(FLIGHT_RESULT.format(id='remote'), {'response': {
+            'status': 200,
+            'content': b'{"results": []}',
+            'headers': [('Content-Type', 'application/json')]
+        }})
+        assert user_client.get(self.url).json() == {'results': []}, (
+            'Проверьте, что запрос ждёт результат лидера из другого воркера'
+        )
+        assert len(calls) == 1
+        cache.delete(FLIGHT_RESULT.format(id='remote'))
+        started = time.monotonic()
+        response = user_client.get(self.url)
+        assert response.status_code == 200
+        assert len(calls) == 2 and time.monotonic() - started >= 0.5, (
+            'Проверьте, что при упавшем лидере запрос вычисляется сам '
+            'после таймаута ожидания'
+        )
+        assert cache.get(key) == 'remote'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_25_batch_requests(self, client, user_client, user, admin,
+                               tags, recipes, monkeypatch):
+        url = '/api/batch/'
+        recipe_url = f'{self.url}{recipes[0].id}/'
+        paths = [recipe_url, '/api/tags/', '/api/users/me/',
+                 f'/api/users/{admin.id}/']
+        expected = [user_client.get(path).json() for path in paths]
+        response = user_client.post(url, [
+            {'method': 'GET', 'path': path} for path in paths
+        ] + [
+            {'method': 'POST', 'path': f'{recipe_url}favorite/'},
+            {'method': 'GET', 'path': f'{recipe_url}?fields=is_favorited'},
+            {'method': 'GET', 'path': '/api/unknown/'},
+            {'method': 'GET', 'path': '/admin/'},
+            {'method': 'GET', 'path': '/docs/'},
+        ], format='json')
+        assert response.status_code == 200
+        data = response.json()
+        assert [item['body'] for item in data[:4]] == expected, (
+            'Проверьте, что `/api/batch/` возвращает ответы подзапросов '
+            'по порядку от имени авторизованного пользователя'
+        )
+        assert [item['status'] for item in data] == [
+            200, 200, 200, 200, 201, 200, 404, 404, 404
+        ], 'Проверьте, что у каждого подзапроса свой статус'
+        assert data[5]['body'] == {'is_favorited': True}, (
+            'Проверьте, что чтение после записи видит её результат'
+        )
+        def broken_list(view, request, *args, **kwargs):
+            raise RuntimeError
+
+        monkeypatch.setattr(TagsViewSet, 'list', broken_list)
+        data = user_client.post(url, [
+            {'method': 'GET', 'path': '/api/tags/'},
+            {'method': 'GET', 'path': '/api/users/me/'}
+        ], format='json').json()
+        assert [item['status'] for item in data] == [500, 200], (
+            'Проверьте, что ошибка подзапроса не ломает весь пакет'
+        )
+        data = user_client.post(url, [
+            {'method': 'GET', 'path': f'{self.url}?stream=true&limit=5'}
+        ], format='json').json()
+        assert data[0]['status'] == 400, (
+            'Проверьте, что потоковые подзапросы отклоняются, '
+            'а не собираются в памяти'
+        )
+        assert client.post(url, json.dumps([
+            {'method': 'GET', 'path': '/api/users/me/'}
+        ]), content_type='application/json').json()[0]['status'] == 401
+        for invalid in [
+            {'path': self.url},
+            [{'method': 'TRACE', 'path': self.url}],
+            [{'method': 'POST', 'path': url}],
+            [{'path': self.url}] * (settings.BATCH_MAX_REQUESTS + 1),
+        ]:
+            response = user_client.post(url, invalid, format='json')
+            assert response.status_code == 400, (
+                'Проверьте, что некорректный пакет возвращает статус 400'
+            )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_26_recipes_flags(self, client, user_client, user, admin,
+                              recipes):
+        url = f'{self.url}flags/'
+        Favorite.objects.create(user=user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=user, recipe=recipes[1])
+        Subscribe.objects.create(user=user, subscribing=admin)
+        ids = [recipes[1].id, recipes[0].id, recipes[1].id, 0]
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.get(
+                url, {'ids': ','.join(map(str, ids))}
+            )
+        assert response.status_code == 200
+        assert response.json() == [
+            {
+                'id': id,
+                'is_favorited': id == recipes[0].id,
+                'is_in_shopping_cart': id == recipes[1].id,
+                'author': {'is_subscribed': id != 0}
+            }
+            for id in ids[:2] + ids[3:]
+        ], (
+            'Проверьте, что `/api/recipes/flags/` возвращает флаги '
+            'пользователя для запрошенных рецептов'
+        )
+        assert len(context.captured_queries) == 4, (
+            'Проверьте, что флаги читаются тремя запросами '
+            'к Favorite, ShoppingCart и Subscribe'
+        )
+        with CaptureQueriesContext(connection) as context:
+            data = client.get(url, {'ids': recipes[0].id}).json()
+        assert data[0]['is_favorited'] is False
+        assert not context.captured_queries
+        for ids in ['1,a', ','.join(map(str, range(1001)))]:
+            assert user_client.get(url, {'ids': ids}).status_code == 400
+
+    @pytest.mark.skipif(
+        connection.vendor != 'postgresql',
+        reason='Ранг float4 и trigram-похожесть есть только в PostgreSQL'
+    )
+    @pytest.mark.django_db(transaction=True)
+    def test_27_recipes_search_rank_cursor(self, client, recipes):
+        for number, recipe in enumerate(recipes):
+            recipe.name = (
+                'Борщ' if number % 2 else f'Борщ домашний {"я" * number}'
+            )
+            recipe.save()
+        data = client.get(self.url, {'search': 'борщ', 'limit': 50}).json()
+        ids = [item['id'] for item in data['results']]
+        data = client.get(
+            self.url, {'search': 'борщ', 'pagination': 'cursor', 'limit': 1}
+        ).json()
+        cursor_ids = [item['id'] for item in data['results']]
+        while data['next']:
+            data = client.get(data['next']).json()
+            cursor_ids += [item['id'] for item in data['results']]
+        assert cursor_ids == ids and len(ids) == len(recipes), (
+            'Проверьте, что курсор по релевантности не теряет и не '
+            'повторяет рецепты с равным или близким рангом'
+        )
@@ -0,0 +1,338 @@
+import random
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from api import renderers
+from api.documents import (
+    add_user_flags,
+    build_values_documents,
+    get_user_flags,
+    recipe_documents_queryset
+)
+from api.pantry import IngredientBitsets, load_matches, pantry_index
+from api.similar import (
+    IngredientIndex,
+    load_ingredient_sets,
+    top_neighbours
+)
+from api.serializers import RECIPE_IMAGES, RecipeListSerializer
+from api.utils import annotate_user_flags
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeCard,
+    ShoppingCart,
+    SimilarRecipe,
+    Tag,
+    TagInRecipe,
+    tags_mask
+)
+from users.models import Subscribe
+
+
+def pantry_matches(pantry, tags=None, limit=20):
+    matches = []
+    for recipe in Recipe.objects.prefetch_related('ingredients', 'tags'):
+        ingredients = {ingredient.id for ingredient in recipe.ingredients.all()}
+        if tags is not None and not tags & {
+                tag.slug for tag in recipe.tags.all()}:
+            continue
+        covered = len(ingredients & pantry)
+        if covered:
+            matches.append(
+                (len(ingredients) - covered, -len(ingredients), recipe.id)
+            )
+    return [(id, missing) for missing, size, id in sorted(matches)[:limit]]
+
+
+def create_dataset(django_user_model, size=40):
+    generator = random.Random(size)
+    authors = [
+        django_user_model.objects.create_user(
+            username=f'author{number}', email=f'author{number}@yamdb.fake',
+            password='1234567', first_name=f'Имя {number}',
+            last_name=f'Фамилия "{number}"'
+        )
+        for number in range(4)
+    ]
+    tags = [
+        Tag.objects.create(
+            name=f'Тег {number}', color=f'#00000{number}', slug=f'tag{number}'
+        )
+        for number in range(5)
+    ]
+    ingredients = [
+        Ingredient.objects.create(
+            name=f'Ингредиент «{number}»', measurement_unit='г'
+        )
+        for number in range(30)
+    ]
+    for number in range(size):
+        recipe = Recipe.objects.create(
+            author=generator.choice(authors),
+            name=f'Рецепт {number} \\ "особый"',
+            image=f'/media/recipes/images/{number}.jpg',
+            text='Описание\nв несколько строк ' * generator.randint(1, 5),
+            cooking_time=generator.randint(1, 240)
+        )
+        recipe_tags = generator.sample(tags, generator.randint(0, 3))
+        for tag in recipe_tags:
+            TagInRecipe.objects.create(recipe=recipe, tag=tag)
+        recipe.tags_mask = tags_mask(tag.bit for tag in recipe_tags)
+        recipe.save(update_fields=['tags_mask'])
+        for ingredient in generator.sample(
+                ingredients, generator.randint(0, 8)):
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient,
+                amount=generator.randint(1, 1000)
+            )
+    return authors, list(Recipe.objects.order_by('id'))
+
+
+class Test03RecipeDocuments:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_01_values_documents_parity(self, django_user_model, user):
+        authors, recipes = create_dataset(django_user_model)
+        for recipe in recipes[::3]:
+            Favorite.objects.create(user=user, recipe=recipe)
+        for recipe in recipes[::4]:
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+        Subscribe.objects.create(user=user, subscribing=authors[0])
+        expected = JSONRenderer().render(RecipeListSerializer(
+            annotate_user_flags(recipe_documents_queryset(), user)
+            .order_by('id'),
+            many=True,
+            context={'request': None}
+        ).data)
+        documents = build_values_documents([recipe.id for recipe in recipes])
+        flags = get_user_flags(user, recipes)
+        actual = JSONRenderer().render([
+            add_user_flags(documents[recipe.id], flags[recipe.id])
+            for recipe in recipes
+        ])
+        assert actual == expected, (
+            'Проверьте, что быстрый путь на `.values()` формирует JSON, '
+            'побайтно совпадающий с `RecipeListSerializer`'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_02_document_builders_api_parity(self, django_user_model,
+                                             user_client, monkeypatch):
+        create_dataset(django_user_model)
+        call_command('recipe_cards')
+        contents = []
+        streamed = {}
+        iter_json = renderers.iter_json
+
+        def counting_iter_json(data, dumps):
+            streamed[builder] = streamed.get(builder, 0) + 1
+            return iter_json(data, dumps)
+
+        monkeypatch.setattr(renderers, 'iter_json', counting_iter_json)
+        for builder in ['serializer', 'values', 'sql', 'cards']:
+            cache.clear()
+            with override_settings(RECIPE_DOCUMENT_BUILDER=builder):
+                contents.append(
+                    user_client.get('/api/recipes/?limit=50').content
+                )
+        assert set(streamed) == {'sql'}, (
+            'Проверьте, что посимвольная сборка JSON используется только '
+            'для ответов с готовыми JSON-фрагментами'
+        )
+        assert len(set(contents)) == 1, (
+            'Проверьте, что ответ `/api/recipes/` не зависит от настройки '
+            '`RECIPE_DOCUMENT_BUILDER`'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_03_recipe_cards(self, django_user_model, user_client, tags,
+                             ingredients, monkeypatch, tmp_path):
+        monkeypatch.setattr('api.serializers.BASE_DIR', str(tmp_path))
+        (tmp_path / RECIPE_IMAGES.strip('/')).mkdir(parents=True)
+        authors, recipes = create_dataset(django_user_model, size=10)
+        call_command('recipe_cards')
+        assert RecipeCard.objects.count() == len(recipes), (
+            'Проверьте, что команда `recipe_cards` создаёт карточки '
+            'для всех рецептов'
+        )
+        Tag.objects.filter(slug='tag0').get().save()
+        authors[0].first_name = 'Новое имя'
+        authors[0].save()
+        Ingredient.objects.first().delete()
+        call_command('recipe_cards', '--verify')
+        response = user_client.post('/api/recipes/', data={
+            'tags': [tags[0].id],
+            'ingredients': [{'id': ingredients[0].id, 'amount': 10}],
+            'name': 'Новый рецепт',
+            'image': 'data:image/png;base64,iVBORw0KGgo=',
+            'text': 'Описание',
+            'cooking_time': 5
+        }, format='json')
+        card = RecipeCard.objects.get(recipe_id=response.json()['id'])
+        assert card.tags == tags[0].slug, (
+            'Проверьте, что при создании рецепта создаётся его карточка'
+        )
+        call_command('recipe_cards', '--verify')
+        IngredientInRecipe.objects.update(amount=1)
+        with pytest.raises(CommandError):
+            call_command('recipe_cards', '--verify')
+
+    @pytest.mark.django_db(transaction=True)
+    def test_04_similar_recipes(self, django_user_model, user_client,
+                                monkeypatch, tmp_path):
+        def stored_neighbours():
+            lists = {}
+            for recipe_id, similar_id in SimilarRecipe.objects.order_by(
+                    'recipe_id', '-score', 'similar_id'
+            ).values_list('recipe_id', 'similar_id'):
+                lists.setdefault(recipe_id, []).append(similar_id)
+            return lists
+
+        def rebuilt_neighbours(max_posting):
+            index = IngredientIndex(load_ingredient_sets(), max_posting)
+            return {
+                recipe_id: [other for other, score in neighbours]
+                for recipe_id, neighbours in (
+                    (recipe_id, index.neighbours(recipe_id))
+                    for recipe_id in index.sets
+                ) if neighbours
+            }
+
+        monkeypatch.setattr('api.serializers.BASE_DIR', str(tmp_path))
+        (tmp_path / RECIPE_IMAGES.strip('/')).mkdir(parents=True)
+        authors, recipes = create_dataset(django_user_model)
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        IngredientInRecipe.objects.bulk_create([
+            IngredientInRecipe(recipe=recipe, ingredient=salt, amount=1)
+            for recipe in recipes
+        ])
+        call_command('similar_recipes')
+        response = user_client.post('/api/recipes/', data={
+            'tags': [],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in recipes[0].ingredients.all()
+            ],
+            'name': 'Копия первого рецепта',
+            'image': 'data:image/png;base64,iVBORw0KGgo=',
+            'text': 'Описание',
+            'cooking_time': 5
+        }, format='json')
+        index = IngredientIndex(load_ingredient_sets())
+        for recipe_id in [recipes[0].id, response.json()['id']]:
+            expected = [
+                other for other, score in top_neighbours(
+                    index.exact_scores(recipe_id)
+                )
+            ]
+            with CaptureQueriesContext(connection) as context:
+                similar = user_client.get(
+                    f'/api/recipes/{recipe_id}/similar/'
+                ).json()
+            assert [item['id'] for item in similar] == expected, (
+                'Проверьте, что `/api/recipes/{id}/similar/` возвращает '
+                'рецепты с наибольшим коэффициентом Жаккара по ингредиентам'
+            )
+            assert len(context.captured_queries) == 2, (
+                'Проверьте, что похожие рецепты читаются одним запросом'
+            )
+        monkeypatch.setattr('api.similar.MAX_POSTING', 12)
+        call_command('similar_recipes')
+        copy_id = response.json()['id']
+        response = user_client.patch(f'/api/recipes/{copy_id}/', data={
+            'tags': [],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in recipes[1].ingredients.all()
+            ],
+            'name': 'Копия второго рецепта',
+            'image': 'data:image/png;base64,iVBORw0KGgo=',
+            'text': 'Описание',
+            'cooking_time': 5
+        }, format='json')
+        assert response.status_code == 200
+        assert stored_neighbours() == rebuilt_neighbours(12), (
+            'Проверьте, что обновление рецепта даёт те же списки похожих, '
+            'что и `similar_recipes` с тем же ограничением списков'
+        )
+        Recipe.objects.get(id=copy_id).delete()
+        recipes[1].delete()
+        assert stored_neighbours() == rebuilt_neighbours(12), (
+            'Проверьте, что после удаления рецепта списки похожих '
+            'дополняются следующими по сходству рецептами'
+        )
+        assert user_client.get(
+            '/api/recipes/0/similar/'
+        ).status_code == 404, (
+            'Проверьте, что для несуществующего рецепта возвращается '
+            'статус 404'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_05_pantry_search(self, django_user_model, client,
+                              monkeypatch):
+        authors, recipes = create_dataset(django_user_model, 80)
+        pantry = set(Ingredient.objects.values_list('id', flat=True)[:12])
+        url = '/api/recipes/pantry/'
+        ingredients = ','.join(map(str, pantry))
+        for params, tags in [
+            ({'ingredients': ingredients}, None),
+            ({'ingredients': ingredients, 'tags': ['tag1', 'tag3']},
+             {'tag1', 'tag3'}),
+        ]:
+            assert load_matches(pantry, tags) == pantry_matches(pantry, tags), (
+                'Проверьте, что пока индекс продуктов строится в фоне, '
+                'поиск по продуктам выполняется в базе с тем же порядком'
+            )
+            data = client.get(url, params).json()
+            assert [
+                (item['id'], item['missing_ingredients']) for item in data
+            ] == pantry_matches(pantry, tags), (
+                'Проверьте, что `/api/recipes/pantry/` упорядочивает рецепты '
+                'по числу недостающих ингредиентов и учитывает теги'
+            )
+            pantry_index.rebuilder.join()
+        index = pantry_index.index
+        recipe = Recipe.objects.get(id=data[0]['id'])
+        IngredientInRecipe.objects.filter(recipe=recipe).exclude(
+            ingredient_id__in=pantry
+        ).delete()
+        recipe.save()
+        recipes[-1].delete()
+        data = client.get(url, {'ingredients': ingredients, 'limit': 80})
+        assert [
+            (item['id'], item['missing_ingredients']) for item in data.json()
+        ] == pantry_matches(pantry, limit=80), (
+            'Проверьте, что индекс продуктов обновляется при изменении '
+            'и удалении рецептов'
+        )
+        assert pantry_index.index is index, (
+            'Проверьте, что индекс продуктов обновляется инкрементально'
+        )
+        locked = []
+        original = IngredientBitsets.search
+
+        def search(bitsets, *args):
+            locked.append(pantry_index.lock.locked())
+            return original(bitsets, *args)
+
+        monkeypatch.setattr(IngredientBitsets, 'search', search)
+        client.get(url, {'ingredients': ingredients})
+        assert locked == [True], (
+            'Проверьте, что поиск читает индекс продуктов под блокировкой, '
+            'пока другие запросы не могут его изменять'
+        )
+        assert client.get(url, {'ingredients': '1,a'}).status_code == 400, (
+            'Проверьте, что некорректный список ингредиентов '
+            'возвращает статус 400'
+        )